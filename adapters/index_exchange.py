@@ -2,6 +2,7 @@
 
 import requests
 import json
+import time
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from .base import PlatformAdapter
@@ -63,7 +64,7 @@ class IndexExchangeAdapter(PlatformAdapter):
         self.auth_token = auth_response.get('access_token')
         self.refresh_token = auth_response.get('refresh_token')
         expires_in = auth_response.get('expires_in', 5400)  # Default 1.5 hours
-        self.token_expires_at = datetime.now().timestamp() + expires_in
+        self.token_expires_at = time.time() + expires_in
         
         return {
             'access_token': self.auth_token,
@@ -77,7 +78,7 @@ class IndexExchangeAdapter(PlatformAdapter):
             return False
         
         # Add 5 minute buffer before expiration
-        return datetime.now().timestamp() < (self.token_expires_at - 300)
+        return time.time() < (self.token_expires_at - 300)
     
     def _refresh_auth_token(self) -> Dict[str, Any]:
         """Refresh the authentication token."""
@@ -103,7 +104,7 @@ class IndexExchangeAdapter(PlatformAdapter):
         
         self.auth_token = auth_response.get('access_token')
         expires_in = auth_response.get('expires_in', 5400)
-        self.token_expires_at = datetime.now().timestamp() + expires_in
+        self.token_expires_at = time.time() + expires_in
         
         return {
             'access_token': self.auth_token,
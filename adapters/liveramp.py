@@ -1,23 +1,222 @@
 """Enhanced LiveRamp Data Marketplace adapter with full catalog sync and intelligent search."""
 
 import requests
-import json
+import orjson
 import sqlite3
 import hashlib
+import re
 from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import chain
 from datetime import datetime, timedelta
 from .base import PlatformAdapter
 import time
 import os
 import sys
+import threading
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: token refreshes are not coordinated across workers
+    fcntl = None
 
 # Import from parent directory
 try:
     from embeddings import EmbeddingsManager
+    from database import (
+        pack_raw_data, unpack_raw_data, ensure_liveramp_fts, ensure_liveramp_indexes,
+        ensure_liveramp_provider_counts, refresh_liveramp_provider_counts,
+        ensure_liveramp_categories, liveramp_category_names, liveramp_segment_cpm,
+        LIVERAMP_CATEGORIES_TABLE_SQL, LIVERAMP_COVERAGE_SQL
+    )
 except ImportError:
     # Fallback for when module is run directly
     sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     from embeddings import EmbeddingsManager
+    from database import (
+        pack_raw_data, unpack_raw_data, ensure_liveramp_fts, ensure_liveramp_indexes,
+        ensure_liveramp_provider_counts, refresh_liveramp_provider_counts,
+        ensure_liveramp_categories, liveramp_category_names, liveramp_segment_cpm,
+        LIVERAMP_CATEGORIES_TABLE_SQL, LIVERAMP_COVERAGE_SQL
+    )
+
+# Tables a sync loads into before they are swapped in as liveramp_segments
+# and liveramp_segment_categories
+SYNC_STAGING_TABLE = 'liveramp_segments_staging'
+SYNC_CATEGORIES_STAGING_TABLE = 'liveramp_segment_categories_staging'
+
+# Segment table schema; also used for the staging table a sync loads into
+_SEGMENTS_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY,
+        segment_id TEXT UNIQUE NOT NULL,
+        name TEXT NOT NULL,
+        description TEXT,
+        provider_name TEXT,
+        segment_type TEXT,
+        reach_count INTEGER,
+        has_pricing BOOLEAN,
+        cpm_price REAL,
+        categories TEXT,
+        raw_data BLOB,
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        search_text TEXT
+    )
+'''
+
+# Rank offset for reciprocal rank fusion in hybrid search; 60 is the usual
+# choice and damps the influence of the very top ranks
+RRF_K = 60
+
+# Decoded segments kept by get_segment_by_id
+SEGMENT_CACHE_SIZE = 4096
+
+# How long get_statistics() results are reused; counts only change on sync
+STATS_CACHE_TTL_SECONDS = 30
+
+
+class _TokenFileLock:
+    """flock-based exclusive lock; a no-op where fcntl or the file is unavailable."""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+    
+    def __enter__(self):
+        if fcntl is None:
+            return self
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._file = open(self.path, 'a')
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        except OSError:
+            if self._file:
+                self._file.close()
+            self._file = None
+        return self
+    
+    def __exit__(self, *exc):
+        if self._file:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        return False
+
+
+# Columns written per segment by the sync, matching _parse_segment's row
+_SEGMENT_INSERT_COLUMNS = (
+    'segment_id', 'name', 'description', 'provider_name', 'segment_type',
+    'reach_count', 'has_pricing', 'cpm_price', 'categories',
+    'raw_data', 'search_text'
+)
+
+# Rows per multi-row INSERT; stays within SQLite's historical 999 bound
+# parameter limit
+SEGMENT_INSERT_ROWS = 999 // len(_SEGMENT_INSERT_COLUMNS)
+
+
+@lru_cache(maxsize=8)
+def _segment_insert_sql(table: str, rows: int) -> str:
+    """Build an INSERT for the given number of segment rows."""
+    placeholders = '(' + ', '.join('?' * len(_SEGMENT_INSERT_COLUMNS)) + ')'
+    return (
+        f"INSERT INTO {table} ({', '.join(_SEGMENT_INSERT_COLUMNS)}) "
+        f"VALUES {', '.join([placeholders] * rows)}"
+    )
+
+
+# Characters stripped from search queries before building an FTS5 expression
+_SANITIZE_RE = re.compile(r'[^\w\s\-]')
+
+# Shared stand-in for missing or malformed nested objects; only ever read
+_EMPTY_DICT: Dict[str, Any] = {}
+
+
+def _safe_dict(value) -> Dict[str, Any]:
+    """Return value if it is a dict, else an empty one, so lookups can chain."""
+    return value if type(value) is dict else _EMPTY_DICT
+
+
+def _parse_segment(segment: Dict) -> tuple:
+    """Flatten a raw LiveRamp segment into a liveramp_segments insert row.
+    
+    Returns the row and the segment's category names. Runs once per
+    segment during sync, so each nested object is looked up
+    once and bound locally rather than re-indexed per check.
+    """
+    get = segment.get
+    name = get('name', '')
+    description = get('description', '')
+    provider = get('providerName', '')
+    
+    # Extract reach
+    reach_count = _safe_dict(_safe_dict(get('reach')).get('inputRecords')).get('count')
+    
+    # Extract pricing, with the same rule as the catalog sync script
+    cpm_price = liveramp_segment_cpm(segment)
+    has_pricing = cpm_price is not None
+    
+    # Extract categories
+    categories = liveramp_category_names(segment)
+    categories_str = ', '.join(categories)
+    
+    return (
+        str(get('id')), name, description, provider, get('segmentType', ''),
+        reach_count, has_pricing, cpm_price, categories_str,
+        pack_raw_data(segment),
+        # Search text for better FTS
+        f"{name} {description} {provider} {categories_str}"
+    ), categories
+
+
+# Columns read back for search and listing results; raw_data is left out
+# so the stored segment JSON is only decoded when a caller asks for it.
+# Coverage is computed in the projection rather than per row in Python.
+_SUMMARY_COLUMNS = (
+    "s.segment_id, s.name, s.description, s.provider_name, "
+    "s.has_pricing, s.cpm_price, s.categories, "
+    f"{LIVERAMP_COVERAGE_SQL} AS coverage_percentage"
+)
+
+# Hot read queries, built once. sqlite3 keeps prepared statements per
+# connection keyed by SQL text, so the cached read connections reuse the
+# compiled plan on every call instead of re-parsing.
+_FTS_SEARCH_SQL = f'''
+    WITH fts_matches AS (
+        SELECT rowid, rank
+        FROM liveramp_segments_fts
+        WHERE liveramp_segments_fts MATCH ?
+        ORDER BY rank
+        LIMIT ?
+    )
+    SELECT {_SUMMARY_COLUMNS},
+           fm.rank * -1 as relevance_score
+    FROM fts_matches fm
+    JOIN liveramp_segments s ON s.id = fm.rowid
+    ORDER BY fm.rank
+'''
+_SAMPLE_SEGMENTS_SQL = f'SELECT {_SUMMARY_COLUMNS} FROM liveramp_segments s LIMIT ?'
+
+
+def _segment_summary(row) -> Dict[str, Any]:
+    """Build a search-result dict from the materialized segment columns."""
+    return {
+        'id': row['segment_id'],  # Use 'id' as primary field for compatibility
+        'name': row['name'],
+        'description': row['description'],
+        'provider_name': row['provider_name'],
+        'data_provider': f"LiveRamp ({row['provider_name']})",
+        'coverage_percentage': row['coverage_percentage'],
+        'base_cpm': row['cpm_price'],  # Changed from 'cpm' to 'base_cpm'
+        'revenue_share_percentage': 0.0,  # Add missing field
+        'has_pricing': row['has_pricing'],
+        'categories': row['categories'].split(', ') if row['categories'] else []
+    }
+
 
 class LiveRampAdapter(PlatformAdapter):
     """Enhanced adapter with full catalog sync and local caching."""
@@ -31,8 +230,15 @@ class LiveRampAdapter(PlatformAdapter):
         self.account_id = config.get('account_id')
         self.auth_token = None
         self.token_expires_at = None
+        # Background renewal of the current token; see _schedule_token_refresh
+        self._refresh_timer = None
+        self._refresh_timer_expiry = None
+        self._refresh_timer_lock = threading.Lock()
+        # Optional file through which tokens are shared with other workers and
+        # restarts; without token_cache_path each process authenticates itself
+        token_cache_path = config.get('token_cache_path')
+        self.token_cache_path = os.path.expanduser(token_cache_path) if token_cache_path else None
         # Use /data/ path for production, local path for development
-        import os
         if os.path.exists('/data'):
             self.db_path = config.get('cache_db_path', '/data/signals_agent.db')
         else:
@@ -43,6 +249,26 @@ class LiveRampAdapter(PlatformAdapter):
         
         self._init_cache_db()
         
+        # Per-thread read-only connections reused across searches
+        self._local = threading.local()
+        
+        # (computed_at, stats) from get_statistics; cleared when a sync is recorded
+        self._stats_cache = None
+        
+        # LRU of decoded segments served by get_segment_by_id, valid for the
+        # sync recorded as _segment_cache_version
+        self._segment_cache: OrderedDict = OrderedDict()
+        self._segment_cache_version = None
+        self._segment_cache_lock = threading.Lock()
+        
+        # Keep-alive session for activation and status calls, so repeated
+        # polling reuses one connection instead of a new TLS handshake each time
+        self._http = requests.Session()
+        self._http.headers.update({
+            'Accept': 'application/json',
+            'LR-Org-Id': self.config.get('owner_org', '')
+        })
+        
         # Initialize embeddings manager if Gemini is configured
         self.embeddings_manager = None
         parent_config = config.get('parent_config', {})
@@ -55,12 +281,21 @@ class LiveRampAdapter(PlatformAdapter):
     
     def authenticate(self) -> Dict[str, Any]:
         """Authenticate with LiveRamp using OAuth2 client credentials flow."""
-        if self._is_token_valid():
-            return {
-                'access_token': self.auth_token,
-                'expires_at': self.token_expires_at
-            }
-        
+        if not self._is_token_valid():
+            # Hold the cache lock across the exchange so workers starting
+            # together make one token request; the rest pick up its result
+            with self._token_cache_lock():
+                if not self._is_token_valid():
+                    self._request_token()
+        
+        self._schedule_token_refresh()
+        return {
+            'access_token': self.auth_token,
+            'expires_at': self.token_expires_at
+        }
+    
+    def _request_token(self):
+        """Exchange the account credentials for a new access token."""
         auth_url = self.token_uri
         headers = {
             'Content-Type': 'application/x-www-form-urlencoded'
@@ -81,18 +316,92 @@ class LiveRampAdapter(PlatformAdapter):
         token_data = response.json()
         self.auth_token = token_data.get('access_token')
         expires_in = token_data.get('expires_in', 3600)
-        self.token_expires_at = datetime.now().timestamp() + expires_in
+        self.token_expires_at = time.time() + expires_in
+        self._save_cached_token()
+    
+    def _schedule_token_refresh(self):
+        """Renew the token in the background as it leaves the validity window.
         
-        return {
-            'access_token': self.auth_token,
-            'expires_at': self.token_expires_at
-        }
+        Activation and status calls then find a valid token in memory
+        instead of waiting on the token endpoint once an hour.
+        """
+        expires_at = self.token_expires_at
+        # _is_token_valid() stops accepting a token 300s before it expires
+        refresh_at = expires_at - 300 if expires_at else None
+        with self._refresh_timer_lock:
+            if self._refresh_timer_expiry == expires_at:
+                return
+            if self._refresh_timer is not None:
+                self._refresh_timer.cancel()
+            self._refresh_timer = None
+            self._refresh_timer_expiry = expires_at
+            if refresh_at is None or refresh_at <= time.time():
+                return
+            timer = threading.Timer(refresh_at - time.time() + 1, self._refresh_token_in_background)
+            timer.daemon = True
+            timer.start()
+            self._refresh_timer = timer
+    
+    def _refresh_token_in_background(self):
+        """Timer callback; a failure leaves renewal to the next caller."""
+        try:
+            self.authenticate()
+        except Exception as e:
+            print(f"[LiveRamp] Background token refresh failed: {e}")
     
     def _is_token_valid(self) -> bool:
-        """Check if current auth token is still valid."""
-        if not self.auth_token or not self.token_expires_at:
+        """Check if current auth token is still valid, falling back to the disk cache."""
+        if self.auth_token and self.token_expires_at and time.time() < (self.token_expires_at - 300):
+            return True
+        return self._load_cached_token()
+    
+    def _token_cache_lock(self):
+        """Exclusive lock on the token cache, shared across processes."""
+        if not self.token_cache_path:
+            return nullcontext()
+        return _TokenFileLock(self.token_cache_path + '.lock')
+    
+    def _load_cached_token(self) -> bool:
+        """Adopt a token from the disk cache if it belongs to this account and is fresh."""
+        if not self.token_cache_path:
+            return False
+        try:
+            with open(self.token_cache_path, 'rb') as f:
+                cached = orjson.loads(f.read())
+            if (cached.get('client_id') != self.client_id
+                    or cached.get('account_id') != self.account_id):
+                return False
+            expires_at = float(cached['expires_at'])
+            access_token = cached['access_token']
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return False
+        
+        if not access_token or time.time() >= expires_at - 300:
             return False
-        return datetime.now().timestamp() < (self.token_expires_at - 300)
+        self.auth_token = access_token
+        self.token_expires_at = expires_at
+        return True
+    
+    def _save_cached_token(self):
+        """Write the current token to the disk cache atomically; failures are non-fatal."""
+        if not self.token_cache_path:
+            return
+        payload = orjson.dumps({
+            'client_id': self.client_id,
+            'account_id': self.account_id,
+            'access_token': self.auth_token,
+            'expires_at': self.token_expires_at
+        })
+        tmp_path = f"{self.token_cache_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.token_cache_path) or '.', exist_ok=True)
+            # The file holds a bearer token, so keep it private to this user
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_path, self.token_cache_path)
+        except OSError as e:
+            print(f"[LiveRamp] Could not cache auth token: {e}")
     
     def _validate_principal_access(self, principal_id: str, account_id: str) -> bool:
         """Validate that the principal has access to the account."""
@@ -105,51 +414,18 @@ class LiveRampAdapter(PlatformAdapter):
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
+        # WAL lets searches keep reading while a sync is writing
+        cursor.execute("PRAGMA journal_mode=WAL")
+        
         # Create segments table with full text search
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS liveramp_segments (
-                id INTEGER PRIMARY KEY,
-                segment_id TEXT UNIQUE NOT NULL,
-                name TEXT NOT NULL,
-                description TEXT,
-                provider_name TEXT,
-                segment_type TEXT,
-                reach_count INTEGER,
-                has_pricing BOOLEAN,
-                cpm_price REAL,
-                categories TEXT,
-                raw_data TEXT,
-                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                search_text TEXT
-            )
-        ''')
+        cursor.execute(_SEGMENTS_TABLE_SQL.format(table='liveramp_segments'))
         
         # Create FTS5 virtual table for full-text search
-        cursor.execute('''
-            CREATE VIRTUAL TABLE IF NOT EXISTS liveramp_segments_fts 
-            USING fts5(
-                segment_id UNINDEXED,
-                name,
-                description,
-                provider_name,
-                categories,
-                content=liveramp_segments,
-                content_rowid=id
-            )
-        ''')
+        ensure_liveramp_fts(cursor)
+        ensure_liveramp_categories(cursor)
         
-        # Create trigger to keep FTS in sync
-        cursor.execute('''
-            CREATE TRIGGER IF NOT EXISTS liveramp_segments_ai 
-            AFTER INSERT ON liveramp_segments BEGIN
-                INSERT INTO liveramp_segments_fts(
-                    rowid, segment_id, name, description, provider_name, categories
-                ) VALUES (
-                    new.id, new.segment_id, new.name, new.description, 
-                    new.provider_name, new.categories
-                );
-            END;
-        ''')
+        # FTS rows are written in batches by the sync, not by a per-row trigger
+        cursor.execute("DROP TRIGGER IF EXISTS liveramp_segments_ai")
         
         # Sync status table (matching database.py schema)
         cursor.execute('''
@@ -163,6 +439,9 @@ class LiveRampAdapter(PlatformAdapter):
             )
         ''')
         
+        ensure_liveramp_indexes(cursor)
+        ensure_liveramp_provider_counts(cursor)
+        
         conn.commit()
         conn.close()
     
@@ -191,97 +470,123 @@ class LiveRampAdapter(PlatformAdapter):
         batch_segments = []
         total_processed = 0
         limit = 100  # LiveRamp API maximum per page
-        after_cursor = None
         page = 0
         
-        # Open database connection once for batch processing
-        conn = sqlite3.connect(self.db_path)
+        # Open database connection once for batch processing. Autocommit mode
+        # so each batch can be committed on its own below.
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
         cursor = conn.cursor()
         
+        # Bulk-load settings: fsync only at WAL checkpoints, keep temp data
+        # and a large page cache in memory
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-262144")
+        cursor.execute("PRAGMA mmap_size=30000000000")
+        
         try:
-            # Begin transaction for entire sync
-            cursor.execute("BEGIN EXCLUSIVE TRANSACTION")
-            
-            # Clear old data once at the start
-            cursor.execute("DELETE FROM liveramp_segments")
-            cursor.execute("DELETE FROM liveramp_segments_fts")
+            # Load into a staging table, committing batch by batch, while
+            # readers keep seeing the previous catalog in liveramp_segments
+            cursor.execute(f"DROP TABLE IF EXISTS {SYNC_STAGING_TABLE}")
+            cursor.execute(f"DROP TABLE IF EXISTS {SYNC_CATEGORIES_STAGING_TABLE}")
+            cursor.execute(_SEGMENTS_TABLE_SQL.format(table=SYNC_STAGING_TABLE))
+            cursor.execute(LIVERAMP_CATEGORIES_TABLE_SQL.format(table=SYNC_CATEGORIES_STAGING_TABLE))
             
-            # Implement cursor-based pagination with batch processing
-            while True:
-                params = {'limit': limit}
+            # Implement cursor-based pagination with batch processing. Pages
+            # have to be requested in order, but the next page is prefetched
+            # on a worker thread while the current one is parsed and stored.
+            with requests.Session() as session, ThreadPoolExecutor(max_workers=1) as prefetcher:
+                session.headers.update(headers)
+                pending = prefetcher.submit(self._fetch_segments_page, session, segments_url, limit, None)
                 
-                # Add cursor if we have one from previous request
-                if after_cursor:
-                    params['after'] = after_cursor
-                
-                try:
-                    response = requests.get(segments_url, headers=headers, params=params)
-                    
-                    if response.status_code == 429:  # Rate limited
-                        retry_after = response.headers.get('Retry-After', '5')
-                        wait_time = int(retry_after) if retry_after.isdigit() else 5
-                        print(f"Rate limited, waiting {wait_time} seconds...")
-                        time.sleep(wait_time)
-                        continue
-                    
-                    if response.status_code != 200:
-                        print(f"Error fetching page {page}: {response.status_code}")
-                        break
-                    
-                    data = response.json()
-                    
-                    # Extract segments
-                    segments = data.get('v3_Segments', [])
-                    if not segments:
-                        print(f"No more segments at page {page + 1}")
-                        break
-                    
-                    batch_segments.extend(segments)
-                    
-                    # Process batch when it reaches BATCH_SIZE
-                    if len(batch_segments) >= BATCH_SIZE:
-                        self._store_segments_incremental(cursor, batch_segments[:BATCH_SIZE])
-                        total_processed += BATCH_SIZE
-                        print(f"Processed batch: {total_processed} segments total")
-                        batch_segments = batch_segments[BATCH_SIZE:]  # Keep remainder
-                    
-                    # Check for next cursor in pagination
-                    pagination = data.get('_pagination', {})
-                    after_cursor = pagination.get('after')
-                    
-                    print(f"Fetched page {page + 1}: {len(segments)} segments (total fetched: {total_processed + len(batch_segments)})") 
-                    
-                    # If no cursor, we've reached the end
-                    if not after_cursor:
-                        print("No more pages available")
+                while pending:
+                    try:
+                        response = pending.result()
+                        pending = None
+                        
+                        if response.status_code != 200:
+                            print(f"Error fetching page {page}: {response.status_code}")
+                            break
+                        
+                        data = orjson.loads(response.content)
+                        
+                        # Extract segments
+                        segments = data.get('v3_Segments', [])
+                        if not segments:
+                            print(f"No more segments at page {page + 1}")
+                            break
+                        
+                        # Check for next cursor in pagination and start fetching it
+                        pagination = data.get('_pagination', {})
+                        after_cursor = pagination.get('after')
+                        if after_cursor:
+                            pending = prefetcher.submit(
+                                self._fetch_segments_page, session, segments_url, limit, after_cursor
+                            )
+                        
+                        batch_segments.extend(segments)
+                        
+                        # Store the whole buffer once it reaches BATCH_SIZE; pages are
+                        # small, so batches overshoot by at most one page and no
+                        # remainder has to be copied forward
+                        if len(batch_segments) >= BATCH_SIZE:
+                            self._store_segments_incremental(
+                                cursor, batch_segments, SYNC_STAGING_TABLE, SYNC_CATEGORIES_STAGING_TABLE
+                            )
+                            total_processed += len(batch_segments)
+                            print(f"Processed batch: {total_processed} segments total")
+                            batch_segments.clear()
+                        
+                        print(f"Fetched page {page + 1}: {len(segments)} segments (total fetched: {total_processed + len(batch_segments)})") 
+                        
+                        # If no cursor, we've reached the end
+                        if not after_cursor:
+                            print("No more pages available")
+                            break
+                        
+                        page += 1
+                        
+                    except Exception as e:
+                        print(f"Error fetching segments page {page}: {e}")
+                        # Continue with what we have rather than losing everything
                         break
-                    
-                    page += 1
-                    
-                    # Remove testing limit for production use
-                    # if total_processed >= 10000:  # Removed for full sync
-                    #     break
-                    
-                    # Rate limiting - be nice to the API
-                    time.sleep(0.5)
-                    
-                except Exception as e:
-                    print(f"Error fetching segments page {page}: {e}")
-                    # Continue with what we have rather than losing everything
-                    break
             
             # Process any remaining segments in the final batch
             if batch_segments:
-                self._store_segments_incremental(cursor, batch_segments)
+                self._store_segments_incremental(
+                    cursor, batch_segments, SYNC_STAGING_TABLE, SYNC_CATEGORIES_STAGING_TABLE
+                )
                 total_processed += len(batch_segments)
                 print(f"Processed final batch: {total_processed} segments total")
             
-            # Commit the entire transaction
-            conn.commit()
+            # Swap the loaded tables in and build the FTS index over them in
+            # one transaction, so readers move from the old catalog to the new
+            # one at commit. legacy_alter_table keeps the rename from rewriting
+            # foreign keys that point at liveramp_segments.
+            cursor.execute("PRAGMA legacy_alter_table=ON")
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("ALTER TABLE liveramp_segments RENAME TO liveramp_segments_old")
+            cursor.execute(f"ALTER TABLE {SYNC_STAGING_TABLE} RENAME TO liveramp_segments")
+            cursor.execute("DROP TABLE liveramp_segments_old")
+            cursor.execute("DROP TABLE liveramp_segment_categories")
+            cursor.execute(f"ALTER TABLE {SYNC_CATEGORIES_STAGING_TABLE} RENAME TO liveramp_segment_categories")
+            ensure_liveramp_indexes(cursor)
+            refresh_liveramp_provider_counts(cursor)
+            cursor.execute("INSERT INTO liveramp_segments_fts(liveramp_segments_fts) VALUES('rebuild')")
+            cursor.execute("INSERT INTO liveramp_segments_fts(liveramp_segments_fts) VALUES('optimize')")
+            cursor.execute("COMMIT")
             print(f"Successfully committed {total_processed} segments to database")
             
+            # Segments may have changed; drop decoded copies
+            with self._segment_cache_lock:
+                self._segment_cache.clear()
+            
         except Exception as e:
-            conn.rollback()
+            if conn.in_transaction:
+                cursor.execute("ROLLBACK")
+            cursor.execute(f"DROP TABLE IF EXISTS {SYNC_STAGING_TABLE}")
+            cursor.execute(f"DROP TABLE IF EXISTS {SYNC_CATEGORIES_STAGING_TABLE}")
             print(f"Error during sync, rolling back: {e}")
             raise
         finally:
@@ -299,298 +604,134 @@ class LiveRampAdapter(PlatformAdapter):
             'status': 'success'
         }
     
-    def _store_segments_incremental(self, cursor, segments: List[Dict]):
+    def _fetch_segments_page(self, session: requests.Session, segments_url: str,
+                             limit: int, after_cursor: Optional[str]) -> requests.Response:
+        """Fetch one catalog page, waiting out rate limits."""
+        params = {'limit': limit}
+        if after_cursor:
+            params['after'] = after_cursor
+            # Optional pacing between pages; 429s are handled below
+            page_delay = float(self.config.get('page_delay_seconds', 0))
+            if page_delay:
+                time.sleep(page_delay)
+        
+        while True:
+            response = session.get(segments_url, params=params)
+            if response.status_code != 429:
+                return response
+            
+            retry_after = response.headers.get('Retry-After', '5')
+            wait_time = int(retry_after) if retry_after.isdigit() else 5
+            print(f"Rate limited, waiting {wait_time} seconds...")
+            time.sleep(wait_time)
+    
+    def _store_segments_incremental(self, cursor, segments: List[Dict],
+                                    table: str = 'liveramp_segments',
+                                    categories_table: str = 'liveramp_segment_categories'):
         """Store segments incrementally during sync without reopening connection."""
-        # Prepare data for batch insert
         segment_data = []
+        category_data = []
         for segment in segments:
-            segment_id = str(segment.get('id'))
-            name = segment.get('name', '')
-            description = segment.get('description', '')
-            provider = segment.get('providerName', '')
-            segment_type = segment.get('segmentType', '')
-            
-            # Extract reach
-            reach_info = segment.get('reach', {})
-            reach_count = None
-            if isinstance(reach_info, dict):
-                input_records = reach_info.get('inputRecords', {})
-                if isinstance(input_records, dict):
-                    reach_count = input_records.get('count')
-            
-            # Extract pricing (check multiple locations)
-            has_pricing = False
-            cpm_price = None
-            
-            # First check 'pricing' field (LiveRamp structure)
-            pricing_obj = segment.get('pricing', {})
-            if pricing_obj:
-                # Try digitalAdTargeting first
-                if 'digitalAdTargeting' in pricing_obj:
-                    dat = pricing_obj['digitalAdTargeting']
-                    if 'value' in dat and 'amount' in dat['value']:
-                        amount = dat['value']['amount']
-                        unit = dat['value'].get('unit', 'CENTS')
-                        if unit == 'CENTS':
-                            cpm_price = amount / 100.0  # Convert cents to dollars
-                        else:
-                            cpm_price = float(amount)
-                        has_pricing = True
-                
-                # Fallback to other pricing types
-                if not has_pricing:
-                    for price_type in ['tvTargeting', 'contentMarketing']:
-                        if price_type in pricing_obj:
-                            pt = pricing_obj[price_type]
-                            if 'value' in pt and 'amount' in pt['value']:
-                                amount = pt['value']['amount']
-                                unit = pt['value'].get('unit', 'CENTS')
-                                if unit == 'CENTS':
-                                    cpm_price = amount / 100.0
-                                else:
-                                    cpm_price = float(amount)
-                                has_pricing = True
-                                break
-            
-            # Fallback to subscriptions (older structure)
-            if not has_pricing:
-                subscriptions = segment.get('subscriptions', [])
-                for sub in subscriptions:
-                    if isinstance(sub, dict):
-                        price_info = sub.get('price', {})
-                        if isinstance(price_info, dict):
-                            cpm_price = price_info.get('cpm')
-                            if cpm_price:
-                                has_pricing = True
-                                break
-            
-            # Extract categories
-            categories = []
-            categories_list = segment.get('categories', [])
-            for cat in categories_list:
-                if isinstance(cat, dict):
-                    cat_name = cat.get('name')
-                    if cat_name:
-                        categories.append(cat_name)
-            categories_str = ', '.join(categories)
-            
-            # Create search text for better FTS
-            search_text = f"{name} {description} {provider} {categories_str}"
-            
-            segment_data.append((
-                segment_id, name, description, provider, segment_type,
-                reach_count, has_pricing, cpm_price, categories_str,
-                json.dumps(segment), search_text
-            ))
-        
-        # Batch insert (no transaction management here, handled by caller)
-        cursor.executemany('''
-            INSERT INTO liveramp_segments (
-                segment_id, name, description, provider_name, segment_type,
-                reach_count, has_pricing, cpm_price, categories,
-                raw_data, search_text
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', segment_data)
+            row, categories = _parse_segment(segment)
+            segment_data.append(row)
+            category_data.extend((category, row[0]) for category in categories)
+        
+        # Insert SEGMENT_INSERT_ROWS rows per statement execution, binding
+        # the flattened row values; leftover rows go through the one-row form
+        full = len(segment_data) - len(segment_data) % SEGMENT_INSERT_ROWS
+        chunks = (
+            tuple(chain.from_iterable(segment_data[i:i + SEGMENT_INSERT_ROWS]))
+            for i in range(0, full, SEGMENT_INSERT_ROWS)
+        )
+        
+        # Each batch is its own short write transaction so a long sync never
+        # holds the write lock throughout. The caller rebuilds the FTS index
+        # once all batches are stored.
+        cursor.execute("BEGIN IMMEDIATE")
+        if full:
+            cursor.executemany(_segment_insert_sql(table, SEGMENT_INSERT_ROWS), chunks)
+        if full < len(segment_data):
+            cursor.executemany(_segment_insert_sql(table, 1), segment_data[full:])
+        cursor.executemany(
+            f"INSERT OR IGNORE INTO {categories_table} (category, segment_id) VALUES (?, ?)",
+            category_data
+        )
+        cursor.execute("COMMIT")
     
-    def _store_segments_batch(self, segments: List[Dict]):
-        """Store segments in database efficiently."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        try:
-            # Begin transaction for atomic operations
-            cursor.execute("BEGIN EXCLUSIVE TRANSACTION")
-            
-            # Clear old data within transaction
-            cursor.execute("DELETE FROM liveramp_segments")
-            # Note: FTS table is auto-updated via triggers
-            
-            # Prepare data for batch insert
-            segment_data = []
-            for segment in segments:
-                segment_id = str(segment.get('id'))
-                name = segment.get('name', '')
-                description = segment.get('description', '')
-                provider = segment.get('providerName', '')
-                segment_type = segment.get('segmentType', '')
-                
-                # Extract reach
-                reach_info = segment.get('reach', {})
-                reach_count = None
-                if isinstance(reach_info, dict):
-                    input_records = reach_info.get('inputRecords', {})
-                    if isinstance(input_records, dict):
-                        reach_count = input_records.get('count')
-                
-                # Extract pricing (Enhanced)
-                has_pricing = False
-                cpm_price = None
-                subscriptions = segment.get('subscriptions', [])
-                
-                # Try multiple methods to find pricing
-                if subscriptions:
-                    for sub in subscriptions:
-                        if isinstance(sub, dict):
-                            # Check price object
-                            price_info = sub.get('price', {})
-                            if isinstance(price_info, dict):
-                                # Try multiple price fields
-                                for field in ['cpm', 'CPM', 'value', 'Value', 'amount', 'cost']:
-                                    if field in price_info and price_info[field] is not None:
-                                        try:
-                                            cpm_price = float(price_info[field])
-                                            has_pricing = True
-                                            break
-                                        except (ValueError, TypeError):
-                                            pass
-                            
-                            # Check subscription root
-                            if not has_pricing:
-                                for field in ['cpm', 'CPM', 'price', 'cost']:
-                                    if field in sub and sub[field] is not None:
-                                        try:
-                                            cpm_price = float(sub[field])
-                                            has_pricing = True
-                                            break
-                                        except (ValueError, TypeError):
-                                            pass
-                        if has_pricing:
-                            break
-                
-                # Check 'pricing' field (LiveRamp structure)
-                if not has_pricing:
-                    pricing_obj = segment.get('pricing', {})
-                    if pricing_obj:
-                        # Try digitalAdTargeting first
-                        if 'digitalAdTargeting' in pricing_obj:
-                            dat = pricing_obj['digitalAdTargeting']
-                            if 'value' in dat and 'amount' in dat['value']:
-                                amount = dat['value']['amount']
-                                unit = dat['value'].get('unit', 'CENTS')
-                                if unit == 'CENTS':
-                                    cpm_price = amount / 100.0  # Convert cents to dollars
-                                else:
-                                    cpm_price = float(amount)
-                                has_pricing = True
-                        
-                        # Fallback to other pricing types
-                        if not has_pricing:
-                            for price_type in ['tvTargeting', 'contentMarketing']:
-                                if price_type in pricing_obj:
-                                    pt = pricing_obj[price_type]
-                                    if 'value' in pt and 'amount' in pt['value']:
-                                        amount = pt['value']['amount']
-                                        unit = pt['value'].get('unit', 'CENTS')
-                                        if unit == 'CENTS':
-                                            cpm_price = amount / 100.0
-                                        else:
-                                            cpm_price = float(amount)
-                                        has_pricing = True
-                                        break
-                
-                # Check root level if still no pricing
-                if not has_pricing:
-                    for field in ['price', 'cpm', 'CPM', 'cost']:
-                        if field in segment:
-                            val = segment[field]
-                            if isinstance(val, (int, float)):
-                                cpm_price = float(val)
-                                has_pricing = True
-                                break
-                
-                # Extract categories
-                categories = []
-                for cat in segment.get('categories', []):
-                    if isinstance(cat, dict):
-                        categories.append(cat.get('name', ''))
-                    else:
-                        categories.append(str(cat))
-                categories_str = ', '.join(categories)
-                
-                segment_data.append((
-                    segment_id, name, description, provider, segment_type,
-                    reach_count, has_pricing, cpm_price, categories_str,
-                    json.dumps(segment)
-                ))
-            
-            # Batch insert
-            cursor.executemany('''
-                INSERT INTO liveramp_segments (
-                    segment_id, name, description, provider_name, segment_type,
-                    reach_count, has_pricing, cpm_price, categories,
-                    raw_data
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', segment_data)
-            
-            # Commit transaction
-            conn.commit()
-            print(f"Successfully stored {len(segments)} segments")
-        except Exception as e:
-            # Rollback on error
-            conn.rollback()
-            print(f"Error storing segments: {e}")
-            raise
-        finally:
-            conn.close()
-    
-    def search_segments_hybrid(self, query: str, limit: int = 20, rag_weight: float = 0.7, use_expansion: bool = True) -> List[Dict[str, Any]]:
+    def search_segments_hybrid(self, query: str, limit: int = 20, rag_weight: float = 0.7, use_expansion: bool = True,
+                               fusion: str = 'weighted') -> List[Dict[str, Any]]:
         """Hybrid search combining RAG and FTS scores with optional query expansion.
         
         Args:
             query: Search query
             limit: Maximum number of results
-            rag_weight: Weight for RAG scores (0-1), FTS gets (1-rag_weight)
+            rag_weight: Weight for RAG scores (0-1), FTS gets (1-rag_weight); weighted fusion only
             use_expansion: Whether to use AI query expansion for RAG search
+            fusion: 'weighted' to combine normalized scores, or 'rrf' for
+                reciprocal rank fusion over the two result orderings
             
         Returns:
             List of segment dictionaries with combined scores
         """
-        results_map = {}
-        
         # Get RAG results if available
         rag_results = []
         if self.embeddings_manager:
             try:
                 rag_results = self.embeddings_manager.get_segments_with_embeddings(query, limit * 2, use_expansion)
-                for result in rag_results:
-                    seg_id = result['id']  # Fixed: use 'id' field instead of 'segment_id'
-                    results_map[seg_id] = result
-                    # Normalize similarity score to 0-1 range
-                    results_map[seg_id]['rag_score'] = result.get('similarity_score', 0)
             except Exception as e:
                 print(f"[LiveRamp] RAG search error: {e}")
         
         # Get FTS results
         fts_results = self.search_segments(query, limit * 2)
         
-        # Normalize FTS scores and combine
-        max_relevance = max([abs(r.get('relevance_score', 0)) for r in fts_results], default=1)
+        # Index the union of both result sets once (RAG entries win on
+        # overlap), then score everything as arrays
+        results_map = {}
+        for result in rag_results:
+            results_map[result['id']] = result  # Fixed: use 'id' field instead of 'segment_id'
+        for result in fts_results:
+            results_map.setdefault(result['id'], result)
+        
+        if not results_map:
+            return []
         
+        positions = {seg_id: i for i, seg_id in enumerate(results_map)}
+        rag_scores = np.zeros(len(positions))
+        fts_relevance = np.zeros(len(positions))
+        for result in rag_results:
+            rag_scores[positions[result['id']]] = result.get('similarity_score', 0)
         for result in fts_results:
-            seg_id = result['id']  # Fixed: use 'id' field instead of 'segment_id'
-            
-            # Normalize FTS score to 0-1 range
-            fts_score = abs(result.get('relevance_score', 0)) / max(abs(max_relevance), 1)
-            
-            if seg_id in results_map:
-                # Combine scores
-                results_map[seg_id]['fts_score'] = fts_score
-                results_map[seg_id]['combined_score'] = (
-                    rag_weight * results_map[seg_id]['rag_score'] +
-                    (1 - rag_weight) * fts_score
-                )
-            else:
-                # FTS-only result
-                result['fts_score'] = fts_score
-                result['rag_score'] = 0
-                result['combined_score'] = (1 - rag_weight) * fts_score
-                results_map[seg_id] = result
+            fts_relevance[positions[result['id']]] = abs(result.get('relevance_score', 0))
+        
+        # Normalize FTS scores to 0-1 range and combine
+        fts_scores = fts_relevance / max(fts_relevance.max(), 1)
+        if fusion == 'rrf':
+            # Each list contributes 1 / (k + rank); only positions matter
+            combined_scores = np.zeros(len(positions))
+            for ranked_results in (rag_results, fts_results):
+                ranks = np.arange(1, len(ranked_results) + 1)
+                idx = [positions[result['id']] for result in ranked_results]
+                np.add.at(combined_scores, idx, 1.0 / (RRF_K + ranks))
+        else:
+            combined_scores = rag_weight * rag_scores + (1 - rag_weight) * fts_scores
         
-        # Sort by combined score
-        results = list(results_map.values())
-        results.sort(key=lambda x: x.get('combined_score', 0), reverse=True)
+        # Select the top `limit` without sorting the whole candidate set
+        if len(combined_scores) > limit:
+            top = np.argpartition(combined_scores, -limit)[-limit:]
+        else:
+            top = np.arange(len(combined_scores))
+        top = top[np.argsort(-combined_scores[top], kind='stable')]
         
-        return results[:limit]
+        results = list(results_map.values())
+        ranked = []
+        for i in top:
+            result = results[i]
+            result['rag_score'] = float(rag_scores[i])
+            result['fts_score'] = float(fts_scores[i])
+            result['combined_score'] = float(combined_scores[i])
+            ranked.append(result)
+        
+        return ranked
     
     def search_segments_rag(self, query: str, limit: int = 10, use_expansion: bool = True) -> List[Dict[str, Any]]:
         """Search segments using RAG (vector similarity) search with optional query expansion.
@@ -624,14 +765,32 @@ class LiveRampAdapter(PlatformAdapter):
             print(f"[LiveRamp] RAG search failed, falling back to FTS: {e}")
             return self.search_segments(query, limit)
     
+    def _get_read_connection(self) -> sqlite3.Connection:
+        """Return this thread's cached read-only connection, opening it once.
+        
+        Every cache read goes through here, so the page cache and parsed
+        schema stay warm across calls instead of being rebuilt per connect.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA cache_size=-65536")
+            conn.execute("PRAGMA mmap_size=268435456")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.execute("PRAGMA query_only=ON")
+            self._local.conn = conn
+        return conn
+    
     def search_segments(self, query: str, limit: int = 200) -> List[Dict[str, Any]]:
         """Search segments using full-text search."""
-        import re
         results = []
         
         # Properly sanitize query to prevent SQL injection
         # Only allow alphanumeric, spaces, and basic punctuation
-        sanitized_query = re.sub(r'[^\w\s\-]', ' ', query)
+        sanitized_query = _SANITIZE_RE.sub(' ', query)
         words = sanitized_query.lower().split()
         
         if not words:
@@ -647,98 +806,94 @@ class LiveRampAdapter(PlatformAdapter):
             # Log this for debugging
             print(f"[LiveRamp] Limited search to {MAX_FTS_TERMS} terms to prevent FTS complexity issues")
         
-        fts_terms = []
-        for word in words:
-            if word.strip():  # Skip empty strings
-                # Quote each word for FTS5
-                fts_terms.append(f'"{word}"')
-        
-        if not fts_terms:
-            return []
+        # Create OR query for FTS5 - this is more efficient than regular SQL OR.
+        # Each word is quoted; split() never yields empty strings.
+        fts_query = ' OR '.join([f'"{word}"' for word in words])
         
-        # Create OR query for FTS5 - this is more efficient than regular SQL OR
-        fts_query = ' OR '.join(fts_terms)
+        conn = self._get_read_connection()
         
-        # Use context manager to ensure connection is properly closed
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+        # Use FTS5 for intelligent search. The top matches are picked from
+        # the FTS index first, so only `limit` rows join back to segments.
+        try:
+            cursor = conn.execute(_FTS_SEARCH_SQL, (fts_query, limit))
             
-            # Use FTS5 for intelligent search
-            try:
-                cursor.execute('''
-                    SELECT s.*, 
-                           rank * -1 as relevance_score
-                    FROM liveramp_segments s
-                    JOIN liveramp_segments_fts fts ON s.id = fts.rowid
-                    WHERE liveramp_segments_fts MATCH ?
-                    ORDER BY rank
-                    LIMIT ?
-                ''', (fts_query, limit))
-                
-                for row in cursor.fetchall():
-                    segment_data = json.loads(row['raw_data'])
-                    
-                    # Calculate coverage percentage
-                    coverage = None
-                    if row['reach_count']:
-                        coverage = (row['reach_count'] / 250_000_000) * 100
-                        coverage = round(min(coverage, 50.0), 1)
-                    
-                    results.append({
-                        'id': row['segment_id'],  # Use 'id' as primary field for compatibility
-                        'name': row['name'],
-                        'description': row['description'],
-                        'data_provider': f"LiveRamp ({row['provider_name']})",
-                        'coverage_percentage': coverage,
-                        'base_cpm': row['cpm_price'],  # Changed from 'cpm' to 'base_cpm'
-                        'revenue_share_percentage': 0.0,  # Add missing field
-                        'has_pricing': row['has_pricing'],
-                        'categories': row['categories'].split(', ') if row['categories'] else [],
-                        'relevance_score': row['relevance_score'],
-                        'raw_data': segment_data,
-                        # Add normalized scores for UI display
-                        'fts_score': 1.0,  # FTS results have maximum FTS score
-                        'rag_score': 0,  # No RAG score in pure FTS search
-                        'combined_score': 1.0,  # In pure FTS, combined = FTS score
-                        'similarity_score': 0  # No similarity in pure FTS
-                    })
-            except sqlite3.OperationalError as e:
-                print(f"[LiveRamp] Search error: {e}")
-                return []
+            for row in cursor.fetchall():
+                result = _segment_summary(row)
+                result['relevance_score'] = row['relevance_score']
+                # Add normalized scores for UI display
+                result['fts_score'] = 1.0  # FTS results have maximum FTS score
+                result['rag_score'] = 0  # No RAG score in pure FTS search
+                result['combined_score'] = 1.0  # In pure FTS, combined = FTS score
+                result['similarity_score'] = 0  # No similarity in pure FTS
+                results.append(result)
+        except sqlite3.OperationalError as e:
+            print(f"[LiveRamp] Search error: {e}")
+            return []
         
         return results
     
+    def _sync_version(self, cursor) -> Optional[tuple]:
+        """Identify the latest recorded sync and its progress.
+        
+        Scheduled syncs run in a separate process, so a change here is how
+        this process learns the catalog was rewritten.
+        """
+        cursor.execute('''
+            SELECT id, sync_completed, total_segments
+            FROM liveramp_sync_status
+            ORDER BY id DESC LIMIT 1
+        ''')
+        row = cursor.fetchone()
+        return tuple(row) if row else None
+    
     def get_segment_by_id(self, segment_id: str) -> Optional[Dict[str, Any]]:
         """Get a specific segment by ID from cache."""
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute('SELECT * FROM liveramp_segments WHERE segment_id = ?', (segment_id,))
-            row = cursor.fetchone()
-            
-            if row:
-                return json.loads(row['raw_data'])
+        conn = self._get_read_connection()
+        cursor = conn.cursor()
+        
+        # Recently decoded segments are kept in memory until a sync is recorded
+        version = self._sync_version(cursor)
+        with self._segment_cache_lock:
+            if version != self._segment_cache_version:
+                self._segment_cache.clear()
+                self._segment_cache_version = version
+            segment = self._segment_cache.get(segment_id)
+            if segment is not None:
+                self._segment_cache.move_to_end(segment_id)
+                return segment
+        
+        cursor.execute('SELECT raw_data FROM liveramp_segments WHERE segment_id = ?', (segment_id,))
+        row = cursor.fetchone()
+        
+        if row:
+            segment = unpack_raw_data(row['raw_data'])
+            with self._segment_cache_lock:
+                # Don't keep a copy read before a newer sync was seen
+                if version == self._segment_cache_version:
+                    self._segment_cache[segment_id] = segment
+                    if len(self._segment_cache) > SEGMENT_CACHE_SIZE:
+                        self._segment_cache.popitem(last=False)
+            return segment
         
         return None
     
     def get_segments_by_category(self, category: str, limit: int = 100) -> List[Dict[str, Any]]:
-        """Get segments by category."""
+        """Get segments in a category (exact name, case-insensitive)."""
         results = []
         
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT * FROM liveramp_segments 
-                WHERE categories LIKE ?
-                LIMIT ?
-            ''', (f'%{category}%', limit))
-            
-            for row in cursor.fetchall():
-                results.append(json.loads(row['raw_data']))
+        conn = self._get_read_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT s.raw_data
+            FROM liveramp_segment_categories c
+            JOIN liveramp_segments s ON s.segment_id = c.segment_id
+            WHERE c.category = ?
+            LIMIT ?
+        ''', (category, limit))
+        
+        for row in cursor.fetchall():
+            results.append(unpack_raw_data(row['raw_data']))
         
         return results
     
@@ -749,58 +904,48 @@ class LiveRampAdapter(PlatformAdapter):
         # ALWAYS use local cache - no automatic sync
         # Sync should only be done by the scheduled sync job
         
-        # Check if database has any segments
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            # Check if we have any segments
-            cursor.execute('SELECT COUNT(*) as count FROM liveramp_segments')
-            count = cursor.fetchone()['count']
-            
-            if count == 0:
+        conn = self._get_read_connection()
+        
+        if search_query:
+            # Check if we have any segments; a single-row probe rather than
+            # counting the whole table
+            if conn.execute('SELECT 1 FROM liveramp_segments LIMIT 1').fetchone() is None:
                 print(f"[LiveRamp] Warning: No segments in cache. Database needs to be synced.")
                 # Return empty list instead of failing
                 return []
-        
-        if search_query:
+            
             # Use hybrid search for best results (combines RAG and FTS)
             segments = self.search_segments_hybrid(search_query, limit=100)
         else:
             # Limit results to prevent overwhelming the system
             # When no search query, return a reasonable sample
             MAX_SEGMENTS = 100
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                
-                cursor.execute('SELECT raw_data FROM liveramp_segments LIMIT ?', (MAX_SEGMENTS,))
-                segments = [json.loads(row['raw_data']) for row in cursor.fetchall()]
+            rows = conn.execute(_SAMPLE_SEGMENTS_SQL, (MAX_SEGMENTS,)).fetchall()
+            
+            # No rows means the cache is empty
+            if not rows:
+                print(f"[LiveRamp] Warning: No segments in cache. Database needs to be synced.")
+                # Return empty list instead of failing
+                return []
+            segments = [_segment_summary(row) for row in rows]
         
         # Normalize to internal format
         return self._normalize_segments(segments, account_id)
     
     def _is_cache_fresh(self, max_age_hours: int = 24) -> bool:
         """Check if cache is fresh enough."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._get_read_connection().cursor()
         
+        # sync_completed is stored as local-time ISO text, hence 'localtime'
         cursor.execute('''
-            SELECT sync_completed FROM liveramp_sync_status 
+            SELECT (julianday('now', 'localtime') - julianday(sync_completed)) * 86400 < ?
+            FROM liveramp_sync_status 
             WHERE status = 'success'
             ORDER BY id DESC LIMIT 1
-        ''')
+        ''', (max_age_hours * 3600,))
         
         row = cursor.fetchone()
-        conn.close()
-        
-        if not row:
-            return False
-        
-        last_sync = datetime.fromisoformat(row[0])
-        age = datetime.now() - last_sync
-        
-        return age.total_seconds() < (max_age_hours * 3600)
+        return bool(row and row[0])
     
     def _record_sync_status(self, total_segments: int, duration: float, status: str):
         """Record sync status in database."""
@@ -817,12 +962,11 @@ class LiveRampAdapter(PlatformAdapter):
         
         conn.commit()
         conn.close()
+        self._stats_cache = None
     
     def _get_sync_status(self) -> Dict[str, Any]:
         """Get current sync status."""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        cursor = self._get_read_connection().cursor()
         
         cursor.execute('''
             SELECT * FROM liveramp_sync_status 
@@ -840,7 +984,6 @@ class LiveRampAdapter(PlatformAdapter):
         cursor.execute('SELECT COUNT(*) as count FROM liveramp_segments')
         result['current_segments'] = cursor.fetchone()['count']
         
-        conn.close()
         return result
     
     def _normalize_segments(self, raw_segments: List[Dict], account_id: str) -> List[Dict[str, Any]]:
@@ -848,6 +991,10 @@ class LiveRampAdapter(PlatformAdapter):
         normalized = []
         
         for segment in raw_segments:
+            if 'data_provider' in segment:
+                # Already flattened from the segment columns
+                normalized.append(self._normalize_summary(segment, account_id))
+                continue
             if isinstance(segment, dict) and 'raw_data' in segment:
                 segment = segment['raw_data']
             
@@ -857,28 +1004,15 @@ class LiveRampAdapter(PlatformAdapter):
             
             seller_name = segment.get('providerName', 'Unknown Provider')
             
-            subscriptions = segment.get('subscriptions', [])
-            cpm = None
-            is_free = False
-            
-            for sub in subscriptions:
-                if isinstance(sub, dict):
-                    price_info = sub.get('price', {})
-                    if isinstance(price_info, dict):
-                        cpm = price_info.get('cpm') or price_info.get('value')
-                        break
-            
-            if cpm == 0 or cpm is None:
-                is_free = True
+            # Same rule the sync stores in cpm_price, so this agrees with
+            # _normalize_summary for the same segment
+            cpm = liveramp_segment_cpm(segment)
+            has_pricing_data = cpm is not None
+            is_free = not cpm
+            if is_free:
                 cpm = 0.0
             
-            reach_info = segment.get('reach', {})
-            reach_value = None
-            
-            if isinstance(reach_info, dict):
-                input_records = reach_info.get('inputRecords', {})
-                if isinstance(input_records, dict):
-                    reach_value = input_records.get('count')
+            reach_value = _safe_dict(_safe_dict(segment.get('reach')).get('inputRecords')).get('count')
             
             coverage = None
             if reach_value:
@@ -900,11 +1034,11 @@ class LiveRampAdapter(PlatformAdapter):
                 'audience_type': 'marketplace',
                 'data_provider': f"LiveRamp ({seller_name})",
                 'coverage_percentage': coverage,
-                'base_cpm': cpm if cpm is not None else 0.0,
+                'base_cpm': cpm,
                 'revenue_share_percentage': 0.0,
                 'is_free': is_free,
                 'has_coverage_data': coverage is not None,
-                'has_pricing_data': cpm is not None,
+                'has_pricing_data': has_pricing_data,
                 'catalog_access': 'personalized',
                 'platform': 'liveramp',
                 'account_id': account_id,
@@ -915,6 +1049,38 @@ class LiveRampAdapter(PlatformAdapter):
         
         return normalized
     
+    def _normalize_summary(self, summary: Dict[str, Any], account_id: str) -> Dict[str, Any]:
+        """Normalize a search/listing result built from the segment columns."""
+        segment_id = summary['id']
+        seller_name = summary.get('provider_name') or 'Unknown Provider'
+        
+        cpm = summary.get('base_cpm')
+        has_pricing_data = cpm is not None
+        is_free = not cpm
+        if is_free:
+            cpm = 0.0
+        
+        coverage = summary.get('coverage_percentage')
+        
+        return {
+            'id': f"liveramp_{account_id}_{segment_id}",
+            'platform_segment_id': str(segment_id),
+            'name': summary.get('name') or f'LiveRamp Segment {segment_id}',
+            'description': summary.get('description') or f"LiveRamp segment from {seller_name}",
+            'audience_type': 'marketplace',
+            'data_provider': f"LiveRamp ({seller_name})",
+            'coverage_percentage': coverage,
+            'base_cpm': cpm,
+            'revenue_share_percentage': 0.0,
+            'is_free': is_free,
+            'has_coverage_data': coverage is not None,
+            'has_pricing_data': has_pricing_data,
+            'catalog_access': 'personalized',
+            'platform': 'liveramp',
+            'account_id': account_id,
+            'categories': summary.get('categories', [])
+        }
+    
     def activate_segment(self, segment_id: str, account_id: str, activation_config: Dict[str, Any]) -> Dict[str, Any]:
         """Activate a segment on LiveRamp Data Marketplace."""
         self.authenticate()
@@ -923,9 +1089,7 @@ class LiveRampAdapter(PlatformAdapter):
         
         headers = {
             'Authorization': f'Bearer {self.auth_token}',
-            'Content-Type': 'application/json',
-            'Accept': 'application/json',
-            'LR-Org-Id': self.config.get('owner_org', '')
+            'Content-Type': 'application/json'
         }
         
         activation_data = {
@@ -935,7 +1099,7 @@ class LiveRampAdapter(PlatformAdapter):
             'destinations': activation_config.get('destinations', [])
         }
         
-        response = requests.post(activation_url, headers=headers, json=activation_data)
+        response = self._http.post(activation_url, headers=headers, json=activation_data)
         
         if response.status_code not in [200, 201]:
             raise Exception(f"Failed to activate segment: {response.status_code} {response.text}")
@@ -957,12 +1121,10 @@ class LiveRampAdapter(PlatformAdapter):
         status_url = f"{self.base_url}/data-marketplace/buyer-api/v3/requested-segments/{segment_id}"
         
         headers = {
-            'Authorization': f'Bearer {self.auth_token}',
-            'Accept': 'application/json',
-            'LR-Org-Id': self.config.get('owner_org', '')
+            'Authorization': f'Bearer {self.auth_token}'
         }
         
-        response = requests.get(status_url, headers=headers)
+        response = self._http.get(status_url, headers=headers)
         
         if response.status_code == 404:
             return {
@@ -1006,10 +1168,12 @@ class LiveRampAdapter(PlatformAdapter):
             }
     
     def get_statistics(self) -> Dict[str, Any]:
-        """Get statistics about cached segments."""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        """Get statistics about cached segments, reusing them for STATS_CACHE_TTL_SECONDS."""
+        cached = self._stats_cache
+        if cached and time.time() - cached[0] < STATS_CACHE_TTL_SECONDS:
+            return cached[1]
+        
+        cursor = self._get_read_connection().cursor()
         
         stats = {}
         
@@ -1025,12 +1189,11 @@ class LiveRampAdapter(PlatformAdapter):
         cursor.execute('SELECT COUNT(*) as count FROM liveramp_segments WHERE reach_count IS NOT NULL')
         stats['segments_with_reach'] = cursor.fetchone()['count']
         
-        # Top providers
+        # Top providers, from the counts summarized at sync time
         cursor.execute('''
-            SELECT provider_name, COUNT(*) as count 
-            FROM liveramp_segments 
-            GROUP BY provider_name 
-            ORDER BY count DESC 
+            SELECT provider_name, cnt as count 
+            FROM liveramp_provider_counts 
+            ORDER BY cnt DESC 
             LIMIT 10
         ''')
         stats['top_providers'] = [dict(row) for row in cursor.fetchall()]
@@ -1038,5 +1201,5 @@ class LiveRampAdapter(PlatformAdapter):
         # Sync status
         stats['sync_status'] = self._get_sync_status()
         
-        conn.close()
+        self._stats_cache = (time.time(), stats)
         return stats
\ No newline at end of file
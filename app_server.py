@@ -4,19 +4,29 @@ Main application server with integrated search UI.
 Runs FastAPI with both MCP endpoints and search UI.
 """
 
-from fastapi import FastAPI, Query, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, Query, HTTPException, Request
+from fastapi.responses import HTMLResponse, ORJSONResponse, Response
+from starlette.exceptions import HTTPException as StarletteHTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Optional
+from fastapi.middleware.gzip import GZipMiddleware
+from typing import Dict, Optional, Tuple
+from functools import lru_cache
+import asyncio
 import json
 import time
 import os
 import sqlite3
+import threading
+import orjson
 from config_loader import load_config
 from adapters.manager import AdapterManager
 
-# Create FastAPI app
-app = FastAPI(title="Audience Agent", version="1.0.0")
+# Create FastAPI app (orjson for all JSON responses)
+app = FastAPI(
+    title="Audience Agent",
+    version="1.0.0",
+    default_response_class=ORJSONResponse
+)
 
 # Add CORS middleware
 app.add_middleware(
@@ -27,22 +37,180 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Search results and the UI page are repetitive JSON/HTML; compress them
+# for clients that accept gzip. Tiny bodies aren't worth the CPU.
+app.add_middleware(GZipMiddleware, minimum_size=500)
+
+# Pre-encoded envelope for error responses: {"detail": <detail>}
+_DETAIL_PREFIX = b'{"detail":'
+_DETAIL_SUFFIX = b'}'
+
+@lru_cache(maxsize=64)
+def _error_body(detail: str) -> bytes:
+    """Encode the error envelope for a string detail; most details repeat."""
+    return _DETAIL_PREFIX + orjson.dumps(detail) + _DETAIL_SUFFIX
+
+@app.exception_handler(StarletteHTTPException)
+async def http_exception_handler(request: Request, exc: StarletteHTTPException):
+    """Render HTTP errors by splicing the encoded detail into a byte template."""
+    if exc.status_code < 200 or exc.status_code in (204, 304):
+        return Response(status_code=exc.status_code, headers=exc.headers)
+    if isinstance(exc.detail, str):
+        body = _error_body(exc.detail)
+    else:
+        body = _DETAIL_PREFIX + orjson.dumps(exc.detail) + _DETAIL_SUFFIX
+    return Response(
+        content=body,
+        status_code=exc.status_code,
+        headers=exc.headers,
+        media_type="application/json"
+    )
+
 # Initialize configuration and adapters
 config = load_config()
 adapter_manager = AdapterManager(config)
 
+# Adapters are created once at startup, so resolve LiveRamp's here
+liveramp_adapter = adapter_manager.adapters.get('liveramp')
+
+# Short-lived cache of encoded /api/search responses. Searches are read-only
+# against a catalog that only changes on sync, so identical queries can be
+# served from memory instead of repeating FTS/embedding/Gemini work.
+SEARCH_CACHE_TTL_SECONDS = 300
+SEARCH_CACHE_MAX_ENTRIES = 1000
+
+# Upper bound on search input. Queries are fed to FTS, embeddings and Gemini,
+# so oversized input is rejected up front instead of driving that work.
+MAX_QUERY_LENGTH = 1000
+_search_cache: Dict[tuple, Tuple[float, bytes]] = {}
+
+# Searches still running, by cache key; identical requests arriving before
+# the first one finishes await its result instead of repeating the work
+_searches_in_flight: Dict[tuple, asyncio.Future] = {}
+
+# /api/stats runs several full-table COUNT/GROUP BY queries whose results only
+# change on sync, so polling is served from a short-lived snapshot
+STATS_CACHE_TTL_SECONDS = 30
+_stats_cache: Dict[str, object] = {'at': 0.0, 'stats': None}
+
+def _get_cached_search(key: tuple) -> Optional[bytes]:
+    """Return cached response bytes for a search key if still fresh."""
+    entry = _search_cache.get(key)
+    if entry is None:
+        return None
+    cached_at, body = entry
+    if time.time() - cached_at >= SEARCH_CACHE_TTL_SECONDS:
+        _search_cache.pop(key, None)
+        return None
+    return body
+
+def _set_cached_search(key: tuple, body: bytes):
+    """Store response bytes for a search key, evicting old entries if full."""
+    if len(_search_cache) >= SEARCH_CACHE_MAX_ENTRIES:
+        now = time.time()
+        for stale_key in [k for k, (t, _) in _search_cache.items() if now - t >= SEARCH_CACHE_TTL_SECONDS]:
+            del _search_cache[stale_key]
+        # Still full - drop the oldest insertion
+        if len(_search_cache) >= SEARCH_CACHE_MAX_ENTRIES:
+            del _search_cache[next(iter(_search_cache))]
+    _search_cache[key] = (time.time(), body)
+
+def _encode_search_response(q: str, mode: str, limit: int, rag_weight: float,
+                            search_time: float, results: list) -> bytes:
+    """Format and encode search results in a single pass.
+    
+    Every field is already a primitive, so the payload goes straight to orjson
+    instead of through jsonable_encoder; results are capped before iterating.
+    """
+    results = results[:limit]
+    return orjson.dumps({
+        "query": q,
+        "mode": mode,
+        "limit": limit,
+        "rag_weight": rag_weight if mode == "hybrid" else None,
+        "search_time": round(search_time * 1000, 2),  # in ms
+        "result_count": len(results),
+        "results": [
+            {
+                "id": r.get("segment_id"),
+                "name": r.get("name"),
+                "description": r.get("description"),
+                "provider": r.get("provider"),
+                "categories": r.get("categories", []),
+                "coverage": r.get("coverage_percentage"),
+                "cpm": r.get("cpm"),
+                "rag_score": r.get("rag_score", 0),
+                "fts_score": r.get("fts_score", 0),
+                "combined_score": r.get("combined_score", 0),
+                "similarity_score": r.get("similarity_score", 0),
+                "relevance_score": r.get("relevance_score", 0)
+            }
+            for r in results
+        ]
+    })
+
+# Per-thread database connections, opened once and reused across requests
+_db_local = threading.local()
+
+# Optional second-stage reranking of search results with a cross-encoder.
+# Needs sentence-transformers, which is not a core dependency; the model is
+# loaded on the first reranked search. Only the top candidates are scored.
+# Without a usable model, reranked searches return results in search order.
+RERANK_MODEL = os.environ.get('RERANK_MODEL', 'BAAI/bge-reranker-v2-m3')
+RERANK_CANDIDATES = 50
+
+@lru_cache(maxsize=1)
+def _load_reranker():
+    """Load the cross-encoder once; failures are not cached."""
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(RERANK_MODEL)
+
+def _get_reranker():
+    """Return the cross-encoder, or None if it is unavailable."""
+    try:
+        return _load_reranker()
+    except ImportError:
+        return None
+    except Exception as e:
+        print(f"Could not load reranker {RERANK_MODEL}: {e}")
+        return None
+
+def _rerank_results(q: str, results: list) -> list:
+    """Reorder the top candidates by cross-encoder relevance to the query.
+    
+    Results past the candidate window keep their order after the reranked
+    ones; without a reranker the results are returned unchanged.
+    """
+    candidates = results[:RERANK_CANDIDATES]
+    if not candidates:
+        return results
+    reranker = _get_reranker()
+    if reranker is None:
+        return results
+    scores = reranker.predict(
+        [(q, f"{r.get('name') or ''} {r.get('description') or ''}") for r in candidates],
+        batch_size=RERANK_CANDIDATES
+    )
+    order = sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True)
+    return [candidates[i] for i in order] + results[RERANK_CANDIDATES:]
+
 def get_db_connection():
-    """Get database connection with row factory."""
-    db_path = os.environ.get('DATABASE_PATH', 'signals_agent.db')
-    conn = sqlite3.connect(db_path, timeout=30.0)
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA journal_mode=WAL")
+    """Get this thread's cached database connection with row factory."""
+    conn = getattr(_db_local, 'conn', None)
+    if conn is None:
+        db_path = os.environ.get('DATABASE_PATH', 'signals_agent.db')
+        conn = sqlite3.connect(db_path, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA cache_size=-65536")
+        conn.execute("PRAGMA mmap_size=268435456")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        _db_local.conn = conn
     return conn
 
-@app.get("/")
-async def home():
-    """Home page with links to different interfaces."""
-    return HTMLResponse(content="""
+# Static home page, encoded once at import
+HOME_PAGE_HTML = """
     <html>
     <head>
         <title>Audience Agent</title>
@@ -83,17 +251,27 @@ async def home():
         </div>
     </body>
     </html>
-    """)
+    """.encode("utf-8")
+
+@app.get("/")
+async def home():
+    """Home page with links to different interfaces."""
+    return HTMLResponse(content=HOME_PAGE_HTML)
+
+@lru_cache(maxsize=1)
+def _search_ui_bytes() -> bytes:
+    """Read and rewrite the search UI page once, then serve it from memory."""
+    with open("search_ui.html", "r") as f:
+        content = f.read()
+    # Update API endpoints to use relative paths
+    content = content.replace('http://localhost:8002', '')
+    return content.encode("utf-8")
 
 @app.get("/search")
 async def serve_search_ui():
     """Serve the search UI HTML page."""
     try:
-        with open("search_ui.html", "r") as f:
-            content = f.read()
-            # Update API endpoints to use relative paths
-            content = content.replace('http://localhost:8002', '')
-            return HTMLResponse(content=content)
+        return HTMLResponse(content=_search_ui_bytes())
     except FileNotFoundError:
         return HTMLResponse(
             content="<h1>Search UI not found. Please ensure search_ui.html exists.</h1>", 
@@ -102,71 +280,93 @@ async def serve_search_ui():
 
 @app.get("/api/search")
 async def search_api(
-    q: str = Query(..., description="Search query"),
+    q: str = Query(..., max_length=MAX_QUERY_LENGTH, description="Search query"),
     mode: str = Query("hybrid", description="Search mode: rag, fts, or hybrid"),
     limit: int = Query(20, description="Number of results"),
     rag_weight: float = Query(0.7, description="Weight for RAG in hybrid mode"),
+    fusion: str = Query("weighted", description="Hybrid score fusion: weighted or rrf"),
+    rerank: bool = Query(False, description="Rerank the top results with a cross-encoder"),
     expand_query: bool = Query(True, description="Use AI to expand query with related terms")
 ):
     """Search LiveRamp segments using different modes with optional query expansion."""
     
     # Get LiveRamp adapter
-    adapter = adapter_manager.adapters.get('liveramp')
+    adapter = liveramp_adapter
     
     if not adapter:
         raise HTTPException(status_code=500, detail="LiveRamp adapter not initialized")
     
+    if fusion not in ("weighted", "rrf"):
+        raise HTTPException(status_code=400, detail=f"Invalid fusion: {fusion}")
+    
+    # Serve identical read-only searches from the response cache
+    cache_key = (q, mode, limit, rag_weight if mode == "hybrid" else None,
+                 fusion if mode == "hybrid" else None, expand_query, rerank)
+    cached_body = _get_cached_search(cache_key)
+    if cached_body is not None:
+        return Response(content=cached_body, media_type="application/json")
+    
+    # A duplicate of a search still running waits for that run
+    pending = _searches_in_flight.get(cache_key)
+    if pending is not None:
+        body = await asyncio.shield(pending)
+        return Response(content=body, media_type="application/json")
+    
+    future = asyncio.get_running_loop().create_future()
+    _searches_in_flight[cache_key] = future
+    try:
+        body = await _run_search(adapter, q, mode, limit, rag_weight, fusion, rerank, expand_query)
+    except BaseException as e:
+        if isinstance(e, asyncio.CancelledError):
+            future.cancel()
+        else:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when there are no waiters
+        raise
+    finally:
+        _searches_in_flight.pop(cache_key, None)
+    
+    future.set_result(body)
+    _set_cached_search(cache_key, body)
+    return Response(content=body, media_type="application/json")
+
+async def _run_search(adapter, q: str, mode: str, limit: int, rag_weight: float,
+                      fusion: str, rerank: bool, expand_query: bool) -> bytes:
+    """Run one /api/search request and return the encoded response."""
     start_time = time.time()
     
+    # Reranking draws from a wider candidate pool than the final page
+    fetch_limit = max(limit, RERANK_CANDIDATES) if rerank else limit
+    
     try:
         if mode == "rag":
             # Pure RAG search
             if not hasattr(adapter, 'embeddings_manager') or not adapter.embeddings_manager:
                 raise HTTPException(status_code=400, detail="Embeddings not available")
-            results = adapter.search_segments_rag(q, limit=limit, use_expansion=expand_query)
+            results = await asyncio.to_thread(adapter.search_segments_rag, q, limit=fetch_limit, use_expansion=expand_query)
             
         elif mode == "fts":
             # Pure FTS search (no expansion for FTS)
-            results = adapter.search_segments(q, limit=limit)
+            results = await asyncio.to_thread(adapter.search_segments, q, limit=fetch_limit)
             
         elif mode == "hybrid":
             # Hybrid search (expansion only affects RAG part)
-            results = adapter.search_segments_hybrid(q, limit=limit, rag_weight=rag_weight, use_expansion=expand_query)
+            results = await asyncio.to_thread(
+                adapter.search_segments_hybrid, q, limit=fetch_limit, rag_weight=rag_weight,
+                use_expansion=expand_query, fusion=fusion
+            )
             
         else:
             raise HTTPException(status_code=400, detail=f"Invalid mode: {mode}")
         
+        if rerank:
+            results = await asyncio.to_thread(_rerank_results, q, results)
+        
         # Calculate search time
         search_time = time.time() - start_time
         
-        # Format results
-        formatted_results = []
-        for r in results:
-            formatted_results.append({
-                "id": r.get("segment_id"),
-                "name": r.get("name"),
-                "description": r.get("description"),
-                "provider": r.get("provider"),
-                "categories": r.get("categories", []),
-                "coverage": r.get("coverage_percentage"),
-                "cpm": r.get("cpm"),
-                "rag_score": r.get("rag_score", 0),
-                "fts_score": r.get("fts_score", 0),
-                "combined_score": r.get("combined_score", 0),
-                "similarity_score": r.get("similarity_score", 0),
-                "relevance_score": r.get("relevance_score", 0)
-            })
-        
-        return {
-            "query": q,
-            "mode": mode,
-            "limit": limit,
-            "rag_weight": rag_weight if mode == "hybrid" else None,
-            "search_time": round(search_time * 1000, 2),  # in ms
-            "result_count": len(formatted_results),
-            "results": formatted_results
-        }
-        
+        return _encode_search_response(q, mode, limit, rag_weight, search_time, results)
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -174,6 +374,17 @@ async def search_api(
 async def get_stats():
     """Get statistics about the database and embeddings."""
     
+    if _stats_cache['stats'] is not None and time.time() - _stats_cache['at'] < STATS_CACHE_TTL_SECONDS:
+        return _stats_cache['stats']
+    
+    # SQLite calls block, so collect off the event loop
+    stats = await asyncio.to_thread(_collect_stats)
+    _stats_cache['at'] = time.time()
+    _stats_cache['stats'] = stats
+    return stats
+
+def _collect_stats() -> dict:
+    """Query database, embeddings and adapter statistics."""
     stats = {
         "database": {},
         "embeddings": {},
@@ -199,7 +410,8 @@ async def get_stats():
     
     # Get sync status
     try:
-        cursor.execute("SELECT * FROM liveramp_sync_status ORDER BY started_at DESC LIMIT 1")
+        # Latest sync by id, the rowid, so no sort is needed
+        cursor.execute("SELECT * FROM liveramp_sync_status ORDER BY id DESC LIMIT 1")
         sync_status = cursor.fetchone()
         if sync_status:
             stats["database"]["last_sync"] = dict(sync_status)
@@ -207,7 +419,7 @@ async def get_stats():
         pass
     
     # Get LiveRamp adapter status
-    adapter = adapter_manager.adapters.get('liveramp')
+    adapter = liveramp_adapter
     
     if adapter:
         stats["adapter"]["initialized"] = True
@@ -216,8 +428,6 @@ async def get_stats():
         stats["adapter"]["initialized"] = False
         stats["adapter"]["has_embeddings"] = False
     
-    conn.close()
-    
     return stats
 
 if __name__ == "__main__":
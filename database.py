@@ -2,8 +2,241 @@
 
 import os
 import sqlite3
+import zlib
+import orjson
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+# zlib level for liveramp_segments.raw_data; low levels already shrink
+# segment JSON several-fold without slowing a full catalog sync
+RAW_DATA_COMPRESSION_LEVEL = 3
+
+
+# Coverage percentage of a liveramp_segments row: reach against a ~250M US
+# online population, capped at 50%. Shared by the search paths so FTS and
+# RAG results agree on the value.
+LIVERAMP_COVERAGE_SQL = (
+    "CASE WHEN reach_count THEN ROUND(MIN(reach_count / 2500000.0, 50.0), 1) END"
+)
+
+
+def pack_raw_data(segment: Dict[str, Any]) -> bytes:
+    """Encode a raw LiveRamp segment for the raw_data column."""
+    return zlib.compress(orjson.dumps(segment), RAW_DATA_COMPRESSION_LEVEL)
+
+
+def unpack_raw_data(raw_data) -> Dict[str, Any]:
+    """Decode a raw_data value, accepting compressed blobs and legacy JSON text."""
+    if isinstance(raw_data, bytes):
+        raw_data = zlib.decompress(raw_data)
+    return orjson.loads(raw_data)
+
+
+# FTS index over liveramp_segments. Porter stemming folds plural/verb forms
+# together and the prefix indexes keep short prefix queries off full scans;
+# rows join back to segments by rowid, so segment_id is not stored here.
+LIVERAMP_FTS_SQL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS liveramp_segments_fts
+    USING fts5(
+        name,
+        description,
+        provider_name,
+        categories,
+        content=liveramp_segments,
+        content_rowid=id,
+        tokenize='porter unicode61 remove_diacritics 2',
+        prefix='2 3 4'
+    )
+"""
+
+
+def ensure_liveramp_fts(cursor):
+    """Create liveramp_segments_fts, rebuilding an index made with an older schema."""
+    cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'liveramp_segments_fts'"
+    )
+    row = cursor.fetchone()
+    migrating = row is not None and 'prefix=' not in row[0]
+    if migrating:
+        # One-time migration; the rebuild reindexes the whole catalog
+        print("Migrating liveramp_segments_fts to the stemmed, prefix-indexed schema; rebuilding...")
+        cursor.execute("DROP TABLE liveramp_segments_fts")
+    cursor.execute(LIVERAMP_FTS_SQL)
+    if row is None or migrating:
+        cursor.execute("INSERT INTO liveramp_segments_fts(liveramp_segments_fts) VALUES('rebuild')")
+    if migrating:
+        print("✓ liveramp_segments_fts rebuilt")
+
+
+def ensure_liveramp_indexes(cursor):
+    """Create the secondary indexes on the LiveRamp tables.
+    
+    Also run after a sync swaps in a freshly loaded liveramp_segments, since
+    indexes go with the table they were created on.
+    """
+    # Latest successful sync lookups (WHERE status = ? ORDER BY id DESC)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_liveramp_sync_status_status_id
+        ON liveramp_sync_status(status, id)
+    """)
+    
+    # Per-provider segment counts in the statistics
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_liveramp_segments_provider_name
+        ON liveramp_segments(provider_name)
+    """)
+
+
+def ensure_liveramp_provider_counts(cursor):
+    """Create the per-provider segment count summary, filling it if empty."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS liveramp_provider_counts (
+            provider_name TEXT,
+            cnt INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_liveramp_provider_counts_cnt
+        ON liveramp_provider_counts(cnt DESC)
+    """)
+    cursor.execute("SELECT 1 FROM liveramp_provider_counts LIMIT 1")
+    if cursor.fetchone() is None:
+        refresh_liveramp_provider_counts(cursor)
+
+
+def refresh_liveramp_provider_counts(cursor):
+    """Recount segments per provider; run once a sync has loaded the catalog.
+    
+    Statistics read the top providers from this small table instead of
+    grouping the whole liveramp_segments table on every request.
+    """
+    cursor.execute("DELETE FROM liveramp_provider_counts")
+    cursor.execute("""
+        INSERT INTO liveramp_provider_counts (provider_name, cnt)
+        SELECT provider_name, COUNT(*)
+        FROM liveramp_segments
+        GROUP BY provider_name
+    """)
+
+
+# Segment-to-category lookup, one row per (category, segment). Category
+# lookups probe the primary key instead of scanning every segment's
+# categories text with a leading-wildcard LIKE. Also used for the staging
+# table a sync loads into.
+LIVERAMP_CATEGORIES_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS {table} (
+        category TEXT NOT NULL COLLATE NOCASE,
+        segment_id TEXT NOT NULL,
+        PRIMARY KEY (category, segment_id)
+    ) WITHOUT ROWID
+"""
+
+
+def liveramp_category_names(segment: Dict[str, Any]) -> List[str]:
+    """Return the category names of a raw LiveRamp segment."""
+    return [
+        cat['name'] for cat in segment.get('categories', ())
+        if type(cat) is dict and cat.get('name')
+    ]
+
+
+# Candidate CPM fields, in order of preference, on a subscription's price
+# object, on the subscription itself, at the segment root, and on a price
+# object at the root
+_PRICE_FIELDS_PRICE = ('cpm', 'CPM', 'value', 'Value', 'amount', 'cost')
+_PRICE_FIELDS_SUB = ('cpm', 'CPM', 'price', 'cost', 'fee')
+_PRICE_FIELDS_ROOT = ('price', 'pricing', 'cpm', 'CPM', 'cost', 'fee')
+_PRICE_FIELDS_ROOT_OBJ = ('cpm', 'CPM', 'value', 'amount')
+
+# Pricing blocks under a segment's 'pricing' field, in order of preference
+_PRICING_TYPES = ('digitalAdTargeting', 'tvTargeting', 'contentMarketing')
+
+
+def _first_num(d: Dict[str, Any], fields: tuple) -> Optional[float]:
+    """Return the first field in d that converts to a float, else None."""
+    for field in fields:
+        value = d.get(field)
+        if value is not None:
+            try:
+                return float(value)
+            except (ValueError, TypeError):
+                pass
+    return None
+
+
+def liveramp_segment_cpm(segment: Dict[str, Any]) -> Optional[float]:
+    """Return a raw LiveRamp segment's CPM in dollars, or None if it lists no price.
+    
+    Checks subscriptions, then root-level price fields, then the 'pricing'
+    blocks, and finally the free flags, stopping at the first match.
+    """
+    for sub in segment.get('subscriptions') or ():
+        if type(sub) is not dict:
+            continue
+        price = sub.get('price')
+        cpm = _first_num(price, _PRICE_FIELDS_PRICE) if type(price) is dict else None
+        if cpm is None:
+            cpm = _first_num(sub, _PRICE_FIELDS_SUB)
+        if cpm is not None:
+            return cpm
+    
+    for field in _PRICE_FIELDS_ROOT:
+        value = segment.get(field)
+        if isinstance(value, (int, float)):
+            return float(value)
+        if type(value) is dict:
+            cpm = _first_num(value, _PRICE_FIELDS_ROOT_OBJ)
+            if cpm is not None:
+                return cpm
+    
+    pricing = segment.get('pricing')
+    if type(pricing) is dict:
+        for price_type in _PRICING_TYPES:
+            block = pricing.get(price_type)
+            value = block.get('value') if type(block) is dict else None
+            if type(value) is dict and 'amount' in value:
+                amount = value['amount']
+                if value.get('unit', 'CENTS') == 'CENTS':
+                    return amount / 100.0  # Convert cents to dollars
+                return float(amount)
+    
+    if segment.get('isFree') or segment.get('is_free') or segment.get('free'):
+        return 0.0
+    return None
+
+
+def ensure_liveramp_categories(cursor):
+    """Create the segment-to-category lookup table, filling it if empty."""
+    cursor.execute(LIVERAMP_CATEGORIES_TABLE_SQL.format(table='liveramp_segment_categories'))
+    cursor.execute("SELECT 1 FROM liveramp_segment_categories LIMIT 1")
+    if cursor.fetchone() is None:
+        refresh_liveramp_categories(cursor)
+
+
+def refresh_liveramp_categories(cursor):
+    """Rebuild the category lookup from the stored segments' raw_data.
+    
+    Syncs write lookup rows as they store segments; this backfills a
+    catalog stored before the table existed. Names come from the segment
+    JSON rather than the ', '-joined categories column, since a category
+    name can itself contain ', '.
+    """
+    cursor.execute("DELETE FROM liveramp_segment_categories")
+    reader = cursor.connection.cursor()
+    reader.execute("SELECT segment_id, raw_data FROM liveramp_segments WHERE categories <> ''")
+    while True:
+        rows = reader.fetchmany(1000)
+        if not rows:
+            break
+        cursor.executemany(
+            "INSERT OR IGNORE INTO liveramp_segment_categories (category, segment_id) VALUES (?, ?)",
+            [
+                (category, segment_id)
+                for segment_id, raw_data in rows
+                for category in liveramp_category_names(unpack_raw_data(raw_data))
+            ]
+        )
+    reader.close()
 
 
 def init_db():
@@ -131,37 +364,17 @@ def create_tables(cursor: sqlite3.Cursor):
             has_pricing BOOLEAN,
             cpm_price REAL,
             categories TEXT,
-            raw_data TEXT,
+            raw_data BLOB,
             last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     """)
     
     # Create FTS5 virtual table for full-text search
-    cursor.execute("""
-        CREATE VIRTUAL TABLE IF NOT EXISTS liveramp_segments_fts 
-        USING fts5(
-            segment_id UNINDEXED,
-            name,
-            description,
-            provider_name,
-            categories,
-            content=liveramp_segments,
-            content_rowid=id
-        ) 
-    """)
+    ensure_liveramp_fts(cursor)
+    ensure_liveramp_categories(cursor)
     
-    # Create trigger to keep FTS in sync
-    cursor.execute("""
-        CREATE TRIGGER IF NOT EXISTS liveramp_segments_ai 
-        AFTER INSERT ON liveramp_segments BEGIN
-            INSERT INTO liveramp_segments_fts(
-                rowid, segment_id, name, description, provider_name, categories
-            ) VALUES (
-                new.id, new.segment_id, new.name, new.description, 
-                new.provider_name, new.categories
-            );
-        END;
-    """)
+    # FTS rows are written in batches by the sync, not by a per-row trigger
+    cursor.execute("DROP TRIGGER IF EXISTS liveramp_segments_ai")
     
     # LiveRamp sync status table
     cursor.execute("""
@@ -176,6 +389,9 @@ def create_tables(cursor: sqlite3.Cursor):
         )
     """)
     
+    ensure_liveramp_indexes(cursor)
+    ensure_liveramp_provider_counts(cursor)
+    
 
 
 def insert_sample_data(cursor: sqlite3.Cursor):
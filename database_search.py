@@ -2,9 +2,13 @@
 
 import sqlite3
 import os
+import re
 from typing import List, Dict, Any, Optional
 from embeddings import EmbeddingsManager
 
+# Characters stripped from search queries before building an FTS5 expression
+_SANITIZE_RE = re.compile(r'[^\w\s\-]')
+
 
 class DatabaseSearchService:
     """Handles different search modes for the signal_segments database."""
@@ -88,8 +92,7 @@ class DatabaseSearchService:
         self.ensure_fts_table()
         
         # Sanitize query for FTS5
-        import re
-        sanitized_query = re.sub(r'[^\w\s\-]', ' ', query)
+        sanitized_query = _SANITIZE_RE.sub(' ', query)
         words = sanitized_query.lower().split()
         
         if not words:
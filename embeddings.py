@@ -1,15 +1,26 @@
 """Vector embeddings management for RAG implementation using Gemini and sqlite-vec."""
 
 import sqlite3
-import json
 import numpy as np
 from typing import List, Dict, Any, Optional, Tuple
-import google.generativeai as genai
 from datetime import datetime, timedelta
 import sqlite_vec
 import hashlib
 import time
 from functools import lru_cache
+from database import unpack_raw_data, LIVERAMP_COVERAGE_SQL
+
+
+@lru_cache(maxsize=None)
+def _load_genai(api_key: str):
+    """Import and configure the Gemini SDK on first use.
+    
+    The import alone takes about half a second, so it is kept off the
+    startup path of every service that builds an EmbeddingsManager.
+    """
+    import google.generativeai as genai
+    genai.configure(api_key=api_key)
+    return genai
 
 
 class EmbeddingsManager:
@@ -30,12 +41,12 @@ class EmbeddingsManager:
         if not api_key:
             raise ValueError("Gemini API key is required for embeddings")
         
-        genai.configure(api_key=api_key)
+        self._api_key = api_key
         # Use the embedding model directly, not GenerativeModel
         self.embedding_dimension = 768  # text-embedding-004 produces 768-dim vectors
         
-        # Initialize generative model for query expansion
-        self.generative_model = genai.GenerativeModel('gemini-1.5-flash')
+        # Generative model for query expansion, created on first use
+        self._generative_model = None
         
         # Cache for search results
         self._search_cache = {}
@@ -45,6 +56,13 @@ class EmbeddingsManager:
         # Initialize database with vector support
         self._init_vector_db()
     
+    @property
+    def generative_model(self):
+        """Gemini model used for query expansion."""
+        if self._generative_model is None:
+            self._generative_model = _load_genai(self._api_key).GenerativeModel('gemini-1.5-flash')
+        return self._generative_model
+    
     def _init_vector_db(self):
         """Initialize the vector database schema."""
         conn = sqlite3.connect(self.db_path)
@@ -96,7 +114,7 @@ class EmbeddingsManager:
         Returns:
             Numpy array containing the embedding vector
         """
-        result = genai.embed_content(
+        result = _load_genai(self._api_key).embed_content(
             model="models/text-embedding-004",
             content=text,
             task_type="RETRIEVAL_DOCUMENT"
@@ -152,7 +170,7 @@ class EmbeddingsManager:
         Returns:
             Numpy array containing the embedding vector
         """
-        result = genai.embed_content(
+        result = _load_genai(self._api_key).embed_content(
             model="models/text-embedding-004",
             content=query,
             task_type="RETRIEVAL_QUERY"
@@ -176,7 +194,7 @@ class EmbeddingsManager:
         
         # Extract categories
         categories = []
-        for cat in segment.get('categories', []):
+        for cat in segment.get('categories', ()):
             if isinstance(cat, dict):
                 categories.append(cat.get('name', ''))
             else:
@@ -421,14 +439,16 @@ class EmbeddingsManager:
                 distance_range = 1.0
         
         for i, (segment_id, distance) in enumerate(similar_segments):
-            cursor.execute('''
-                SELECT * FROM liveramp_segments 
+            cursor.execute(f'''
+                SELECT segment_id, name, description, provider_name,
+                       has_pricing, cpm_price, categories,
+                       {LIVERAMP_COVERAGE_SQL} AS coverage_percentage
+                FROM liveramp_segments 
                 WHERE segment_id = ?
             ''', (segment_id,))
             
             row = cursor.fetchone()
             if row:
-                segment_data = json.loads(row['raw_data'])
                 
                 # Calculate similarity score using multiple methods for better distribution
                 # 1. Min-max normalization (inverted so lower distance = higher score)
@@ -445,25 +465,19 @@ class EmbeddingsManager:
                 # Prioritize normalized score but include rank for tie-breaking
                 similarity_score = (0.7 * normalized_score + 0.2 * exp_score + 0.1 * rank_score)
                 
-                # Calculate coverage percentage
-                coverage = None
-                if row['reach_count']:
-                    coverage = (row['reach_count'] / 250_000_000) * 100
-                    coverage = round(min(coverage, 50.0), 1)
-                
                 results.append({
                     'id': row['segment_id'],  # Use 'id' as primary field for compatibility
                     'name': row['name'],
                     'description': row['description'],
+                    'provider_name': row['provider_name'],
                     'data_provider': f"LiveRamp ({row['provider_name']})",  # Changed to data_provider with LiveRamp prefix
-                    'coverage_percentage': coverage,
+                    'coverage_percentage': row['coverage_percentage'],
                     'base_cpm': row['cpm_price'],  # Changed from 'cpm' to 'base_cpm'
                     'revenue_share_percentage': 0.0,  # Add missing field
                     'has_pricing': row['has_pricing'],
                     'categories': row['categories'].split(', ') if row['categories'] else [],
                     'similarity_score': float(similarity_score),
-                    'vector_distance': float(distance),
-                    'raw_data': segment_data
+                    'vector_distance': float(distance)
                 })
         
         conn.close()
@@ -496,7 +510,7 @@ class EmbeddingsManager:
         
         segments = []
         for row in cursor.fetchall():
-            segments.append(json.loads(row['raw_data']))
+            segments.append(unpack_raw_data(row['raw_data']))
         
         conn.close()
         return segments
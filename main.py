@@ -1,15 +1,18 @@
 """Main MCP server implementation for the Signals Activation Protocol."""
 
-import json
+import asyncio
 import sqlite3
+import orjson
 import sys
 import os
-import random
-import string
+import re
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
 
-import google.generativeai as genai
 from fastmcp import FastMCP
 from fastapi import Query, HTTPException
 from fastapi.responses import HTMLResponse, JSONResponse
@@ -23,44 +26,64 @@ from config_loader import load_config
 from database_search import DatabaseSearchService
 
 
-# In-memory storage for custom segments and activations
+# In-memory storage for custom segments and activations. Discovery runs on
+# worker threads, so every read and write holds _memory_cache_lock.
 custom_segments: Dict[str, Dict] = {}
 segment_activations: Dict[str, Dict] = {}
+_memory_cache_lock = threading.Lock()
 
 # Memory cleanup configuration
 MAX_CUSTOM_SEGMENTS = 1000
 MAX_SEGMENT_ACTIVATIONS = 5000
 CLEANUP_INTERVAL_HOURS = 24
 
+# A duplicate get_signals call (a client retry) arriving while the same
+# discovery is still running shares that run instead of paying for AI
+# ranking and proposals again. Finished responses are not reused: each
+# completed call gets its own context_id and custom segment IDs.
+_discoveries_in_flight: Dict[tuple, asyncio.Future] = {}
+
+# Parsed Gemini answers (rankings, proposals) for recently seen prompt
+# inputs; a repeated query skips the model round-trip
+AI_RESULT_CACHE_SIZE = 1024
+_ai_result_cache: OrderedDict = OrderedDict()
+_ai_result_cache_lock = threading.Lock()
+
+# Worker threads for discovery steps that overlap: the platform adapter
+# search runs beside the database search, and custom proposals beside ranking
+_discovery_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="discovery")
+
 
 def cleanup_memory_caches():
-    """Clean up old entries from in-memory caches to prevent memory leaks."""
-    global custom_segments, segment_activations
-    
-    # Clean up old custom segments (keep only recent ones)
-    if len(custom_segments) > MAX_CUSTOM_SEGMENTS:
-        # Sort by creation time, keep most recent
-        segments_by_time = sorted(
-            custom_segments.items(),
-            key=lambda x: x[1].get('created_at', ''),
-            reverse=True
-        )
-        # Keep only the most recent MAX_CUSTOM_SEGMENTS
-        custom_segments = dict(segments_by_time[:MAX_CUSTOM_SEGMENTS])
-        console.print(f"[dim]Cleaned up old custom segments, kept {len(custom_segments)}[/dim]")
-    
-    # Clean up old activations (keep only those from last 24 hours)
-    if len(segment_activations) > MAX_SEGMENT_ACTIVATIONS:
-        cutoff_time = (datetime.now() - timedelta(hours=CLEANUP_INTERVAL_HOURS)).isoformat()
-        cleaned_activations = {}
-        
-        for key, activation in segment_activations.items():
-            activation_time = activation.get('activation_started_at', '')
-            if activation_time > cutoff_time:
-                cleaned_activations[key] = activation
+    """Clean up old entries from in-memory caches to prevent memory leaks.
+    
+    Prunes the dicts in place under _memory_cache_lock, so entries added by
+    other discovery threads are neither lost nor seen mid-iteration.
+    """
+    with _memory_cache_lock:
+        # Clean up old custom segments (keep only recent ones)
+        if len(custom_segments) > MAX_CUSTOM_SEGMENTS:
+            # Sort by creation time, keep most recent
+            segments_by_time = sorted(
+                custom_segments.items(),
+                key=lambda x: x[1].get('created_at', ''),
+                reverse=True
+            )
+            # Keep only the most recent MAX_CUSTOM_SEGMENTS
+            for custom_id, _ in segments_by_time[MAX_CUSTOM_SEGMENTS:]:
+                del custom_segments[custom_id]
+            console.print(f"[dim]Cleaned up old custom segments, kept {len(custom_segments)}[/dim]")
         
-        segment_activations = cleaned_activations
-        console.print(f"[dim]Cleaned up old activations, kept {len(segment_activations)}[/dim]")
+        # Clean up old activations (keep only those from last 24 hours)
+        if len(segment_activations) > MAX_SEGMENT_ACTIVATIONS:
+            cutoff_time = (datetime.now() - timedelta(hours=CLEANUP_INTERVAL_HOURS)).isoformat()
+            stale_keys = [
+                key for key, activation in segment_activations.items()
+                if activation.get('activation_started_at', '') <= cutoff_time
+            ]
+            for key in stale_keys:
+                del segment_activations[key]
+            console.print(f"[dim]Cleaned up old activations, kept {len(segment_activations)}[/dim]")
 
 
 def get_db_connection():
@@ -73,11 +96,38 @@ def get_db_connection():
     return conn
 
 
+# (epoch_second, formatted) pair for current_timestamp(); swapped atomically
+_timestamp_cache = (0, "")
+
+
+def current_timestamp() -> str:
+    """Return local time as an ISO-8601 string, formatting at most once per second."""
+    global _timestamp_cache
+    now = int(time.time())
+    cached_second, formatted = _timestamp_cache
+    if now != cached_second:
+        formatted = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(now))
+        _timestamp_cache = (now, formatted)
+    return formatted
+
+
+def deployment_from_row(dep: Dict[str, Any]) -> PlatformDeployment:
+    """Build a PlatformDeployment from a platform_deployments row.
+    
+    The table's NOT NULL and CHECK constraints already guarantee the field
+    types, so validation is skipped; only is_live comes back as 0/1.
+    """
+    return PlatformDeployment.model_construct(**{**dep, 'is_live': bool(dep['is_live'])})
+
+
+def generate_short_id(prefix: str) -> str:
+    """Generate a short random ID in format <prefix>_<12 hex chars>."""
+    return f"{prefix}_{os.urandom(6).hex()}"
+
+
 def generate_context_id() -> str:
     """Generate a unique context ID in format ctx_<timestamp>_<random>."""
-    timestamp = int(datetime.now().timestamp())
-    random_suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
-    return f"ctx_{timestamp}_{random_suffix}"
+    return f"ctx_{int(time.time())}_{secrets.token_hex(4)}"
 
 
 def store_discovery_context(context_id: str, query: str, principal_id: Optional[str], 
@@ -103,7 +153,7 @@ def store_discovery_context(context_id: str, query: str, principal_id: Optional[
     """, (
         context_id,
         principal_id,
-        json.dumps(metadata),
+        orjson.dumps(metadata).decode(),
         created_at.isoformat(),
         expires_at.isoformat()
     ))
@@ -148,7 +198,7 @@ def store_activation_context(parent_context_id: Optional[str], signal_id: str,
         context_id,
         parent_context_id,
         principal_id,
-        json.dumps(metadata),
+        orjson.dumps(metadata).decode(),
         created_at.isoformat(),
         expires_at.isoformat()
     ))
@@ -231,6 +281,30 @@ def generate_discovery_message(signal_spec: str, signals: List[SignalResponse],
     return " ".join(message_parts)
 
 
+def _substring_matcher(terms: List[str]) -> re.Pattern:
+    """Compile terms into one pattern that matches any of them as a substring."""
+    return re.compile('|'.join(map(re.escape, terms)))
+
+
+# Keyword groups for determine_search_strategy, each matched in a single
+# regex scan of the lowercased query rather than one `in` check per term
+_INTENT_INDICATORS_RE = _substring_matcher([
+    'interested', 'likely', 'intent', 'looking', 'seeking', 'want',
+    'lifestyle', 'behavior', 'habit', 'preference', 'affinity',
+    'enthusiast', 'lover', 'fan', 'conscious', 'aware', 'minded'
+])
+_CONCEPTUAL_TERMS_RE = _substring_matcher([
+    'luxury', 'premium', 'budget', 'eco', 'green', 'sustainable',
+    'health', 'wellness', 'fitness', 'active', 'affluent', 'trendy',
+    'modern', 'traditional', 'conservative', 'progressive'
+])
+_DEMOGRAPHIC_TERMS_RE = _substring_matcher([
+    'age', 'gender', 'income', 'education', 'parent', 'family',
+    'married', 'single', 'retired', 'student', 'professional',
+    'homeowner', 'renter', 'urban', 'suburban', 'rural'
+])
+
+
 def determine_search_strategy(signal_spec: str) -> tuple[str, bool]:
     """Determine the best search mode and whether to use query expansion.
     
@@ -264,31 +338,18 @@ def determine_search_strategy(signal_spec: str) -> tuple[str, bool]:
         # Likely company/brand names
         return ('fts', False)
     
+    spec_lower = signal_spec.lower()
+    
     # Check for behavioral/intent indicators → RAG is best
-    intent_indicators = [
-        'interested', 'likely', 'intent', 'looking', 'seeking', 'want',
-        'lifestyle', 'behavior', 'habit', 'preference', 'affinity',
-        'enthusiast', 'lover', 'fan', 'conscious', 'aware', 'minded'
-    ]
-    if any(indicator in signal_spec.lower() for indicator in intent_indicators):
+    if _INTENT_INDICATORS_RE.search(spec_lower):
         return ('rag', True)
     
     # Check for conceptual/thematic queries → RAG is best
-    conceptual_terms = [
-        'luxury', 'premium', 'budget', 'eco', 'green', 'sustainable',
-        'health', 'wellness', 'fitness', 'active', 'affluent', 'trendy',
-        'modern', 'traditional', 'conservative', 'progressive'
-    ]
-    if any(term in signal_spec.lower() for term in conceptual_terms):
+    if _CONCEPTUAL_TERMS_RE.search(spec_lower):
         return ('rag', True)
     
     # Check for demographic queries → Hybrid works well
-    demographic_terms = [
-        'age', 'gender', 'income', 'education', 'parent', 'family',
-        'married', 'single', 'retired', 'student', 'professional',
-        'homeowner', 'renter', 'urban', 'suburban', 'rural'
-    ]
-    if any(term in signal_spec.lower() for term in demographic_terms):
+    if _DEMOGRAPHIC_TERMS_RE.search(spec_lower):
         # Hybrid search with expansion for demographic queries
         return ('hybrid', len(words) <= 3)  # Expand if query is short
     
@@ -348,6 +409,61 @@ def should_use_query_expansion(signal_spec: str) -> bool:
     return True
 
 
+def strip_json_fence(text: str) -> str:
+    """Strip a markdown code fence (```json ... ```) from an AI response."""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text[3:]
+        if text.startswith("json"):
+            text = text[4:]
+        if text.endswith("```"):
+            text = text[:-3]
+        text = text.strip()
+    return text
+
+
+def normalize_query(text: str) -> str:
+    """Lowercase and collapse whitespace so trivially different queries match."""
+    return ' '.join(text.lower().split())
+
+
+def get_model():
+    """Return the shared Gemini model, importing and configuring the SDK once."""
+    global model
+    if model is None:
+        # Discovery threads can race here; only one builds the model
+        with _model_lock:
+            if model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=config.get("gemini_api_key", "your-api-key-here"))
+                model = genai.GenerativeModel('gemini-2.0-flash-exp')
+    return model
+
+
+def generate_ai_json(cache_key: tuple, prompt: str) -> Any:
+    """Ask Gemini for a JSON answer, reusing the parsed result for a repeated key.
+    
+    Errors propagate and are not cached.
+    """
+    with _ai_result_cache_lock:
+        cached = _ai_result_cache.get(cache_key)
+        if cached is not None:
+            _ai_result_cache.move_to_end(cache_key)
+            return cached
+    
+    response = get_model().generate_content(prompt)
+    result = orjson.loads(strip_json_fence(response.text))
+    with _ai_result_cache_lock:
+        _ai_result_cache[cache_key] = result
+        if len(_ai_result_cache) > AI_RESULT_CACHE_SIZE:
+            _ai_result_cache.popitem(last=False)
+    return result
+
+
+# Characters that would break a pipe-delimited prompt row
+_PROMPT_FIELD_TRANS = str.maketrans({'|': '/', '\n': ' '})
+
+
 def rank_signals_with_ai(signal_spec: str, segments: List[Dict], max_results: int = 10) -> List[Dict]:
     """Use Gemini to intelligently rank signals based on the specification."""
     if not segments:
@@ -360,36 +476,33 @@ def rank_signals_with_ai(signal_spec: str, segments: List[Dict], max_results: in
         console.print(f"[dim]Reducing {len(segments)} segments to {MAX_SEGMENTS_FOR_PROMPT} for AI processing[/dim]")
         segments = segments[:MAX_SEGMENTS_FOR_PROMPT]
     
-    # Prepare segment data for AI analysis - keep it very concise to avoid expression tree depth issues
-    segment_data = []
-    for i, segment in enumerate(segments):
-        # Aggressively truncate to reduce complexity
-        name = segment.get("name", "")[:50]  # Even shorter
-        desc = segment.get("description", "")[:80]  # Much shorter
-        
-        segment_data.append({
-            "id": segment["id"],
-            "name": name,
-            "desc": desc,
-            "cov": round(segment.get("coverage_percentage", 0), 1),
-            "cpm": round(segment.get("base_cpm", 0), 2)
-        })
+    # Prepare segment data for AI analysis - one pipe-delimited row per
+    # segment; JSON objects repeated every key and quote on each row
+    segment_rows = []
+    for segment in segments:
+        # Aggressively truncate to reduce complexity; '|' and newlines
+        # would break the row format
+        name = segment.get("name", "")[:50].translate(_PROMPT_FIELD_TRANS)  # Even shorter
+        desc = segment.get("description", "")[:80].translate(_PROMPT_FIELD_TRANS)  # Much shorter
+        cov = round(segment.get("coverage_percentage", 0), 1)
+        cpm = round(segment.get("base_cpm", 0), 2)
+        segment_rows.append(f"{segment['id']}|{name}|{desc}|{cov}|{cpm}")
+    segments_table = "\n    ".join(segment_rows)
     
     # Create a more concise prompt
     prompt = f"""
     Rank segments for: "{signal_spec}"
     
-    Top {len(segment_data)} segments:
-    {json.dumps(segment_data)}
+    Top {len(segment_rows)} segments (id|name|description|coverage %|cpm):
+    {segments_table}
     
     Return top {max_results} as JSON:
     [{{"segment_id": "id", "relevance_score": 0.9, "match_reason": "why"}}]
     """
     
     try:
-        response = model.generate_content(prompt)
-        clean_json_str = response.text.strip().replace("```json", "").replace("```", "").strip()
-        ai_rankings = json.loads(clean_json_str)
+        cache_key = ('rank', normalize_query(signal_spec), segments_table, max_results)
+        ai_rankings = generate_ai_json(cache_key, prompt)
         
         # Reorder segments based on AI ranking
         ranked_segments = []
@@ -456,7 +569,7 @@ def generate_custom_segment_proposals(signal_spec: str, existing_segments: List[
     You are a contextual signal targeting expert. A client is looking for: "{signal_spec}"
     
     We found these existing Peer39 segments:
-    {json.dumps(existing_names, indent=2)}
+    {orjson.dumps(existing_names, option=orjson.OPT_INDENT_2).decode()}
     
     Based on the client's request, propose 2-3 NEW custom contextual segments that Peer39 could create to better serve this targeting need. These should be segments that don't currently exist but would be valuable.
     
@@ -481,10 +594,8 @@ def generate_custom_segment_proposals(signal_spec: str, existing_segments: List[
     """
     
     try:
-        response = model.generate_content(prompt)
-        clean_json_str = response.text.strip().replace("```json", "").replace("```", "").strip()
-        proposals = json.loads(clean_json_str)
-        return proposals
+        cache_key = ('proposals', normalize_query(signal_spec), tuple(existing_names))
+        return generate_ai_json(cache_key, prompt)
         
     except Exception as e:
         error_msg = str(e)
@@ -499,9 +610,10 @@ def generate_custom_segment_proposals(signal_spec: str, existing_segments: List[
 config = load_config()
 # init_db() moved to if __name__ == "__main__" section
 
-# Initialize Gemini
-genai.configure(api_key=config.get("gemini_api_key", "your-api-key-here"))
-model = genai.GenerativeModel('gemini-2.0-flash-exp')
+# Gemini model, built on first use by get_model(); importing the SDK alone
+# takes about half a second of server startup
+model = None
+_model_lock = threading.Lock()
 
 # Initialize platform adapters
 adapter_manager = AdapterManager(config)
@@ -582,7 +694,7 @@ def get_signal_examples() -> Dict[str, Any]:
 
 
 @mcp.tool
-def get_signals(
+async def get_signals(
     signal_spec: str,
     deliver_to: DeliverySpecification,
     filters: Optional[SignalFilters] = None,
@@ -617,6 +729,51 @@ def get_signals(
         List of matching signals with deployment status, pricing, and AI-generated
         match explanations. Also includes custom segment proposals when relevant.
     """
+    # Keyed on the exact query, since the response message quotes it. The
+    # AI result cache is what absorbs case and spacing variants.
+    key = (
+        signal_spec,
+        deliver_to.model_dump_json(),
+        filters.model_dump_json() if filters else None,
+        max_results,
+        principal_id
+    )
+    
+    # A duplicate of a request still running waits for that run
+    pending = _discoveries_in_flight.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+    
+    future = asyncio.get_running_loop().create_future()
+    _discoveries_in_flight[key] = future
+    try:
+        # Discovery does blocking SQLite and Gemini I/O, so run it on a worker
+        # thread instead of stalling the event loop for every concurrent client
+        response = await asyncio.to_thread(
+            discover_signals, signal_spec, deliver_to, filters, max_results, principal_id
+        )
+    except BaseException as e:
+        if isinstance(e, asyncio.CancelledError):
+            future.cancel()
+        else:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when there are no waiters
+        raise
+    finally:
+        _discoveries_in_flight.pop(key, None)
+    
+    future.set_result(response)
+    return response
+
+
+def discover_signals(
+    signal_spec: str,
+    deliver_to: DeliverySpecification,
+    filters: Optional[SignalFilters] = None,
+    max_results: Optional[int] = 10,
+    principal_id: Optional[str] = None
+) -> GetSignalsResponse:
+    """Run signal discovery synchronously (see get_signals for details)."""
     
     # Input validation
     if not signal_spec or not isinstance(signal_spec, str):
@@ -670,6 +827,15 @@ def get_signals(
     else:  # hybrid
         console.print(f"[dim]→ Using Hybrid to combine semantic and keyword matching[/dim]")
     
+    # Platform adapters (LiveRamp hybrid search, embeddings, query expansion)
+    # search on a worker thread while the database search runs here
+    platform_future = _discovery_executor.submit(
+        adapter_manager.get_all_segments,
+        deliver_to.model_dump(),
+        principal_id,
+        signal_spec  # Pass search query for LiveRamp and other adapters
+    )
+    
     # Search database segments using the determined strategy
     db_segments = []
     try:
@@ -692,11 +858,7 @@ def get_signals(
     
     try:
         # Get platform segments (LiveRamp adapter already supports search_mode and use_expansion)
-        platform_segments = adapter_manager.get_all_segments(
-            deliver_to.model_dump(), 
-            principal_id,
-            signal_spec  # Pass search query for LiveRamp and other adapters
-        )
+        platform_segments = platform_future.result()
         if platform_segments:
             console.print(f"[green]✓ Found {len(platform_segments)} segments from platform APIs[/green]")
         else:
@@ -804,21 +966,22 @@ def get_signals(
                 include_platform = platform_name in requested_platforms
 
             if include_platform:
-                # Create a deployment record for the platform segment
-                platform_deployments = [PlatformDeployment(
-                    signals_agent_segment_id=segment['id'],
+                # Create a deployment record for the platform segment; every
+                # field is set here, so skip pydantic validation
+                platform_deployments = [PlatformDeployment.model_construct(
                     platform=platform_name,
                     account=account_id,
                     decisioning_platform_segment_id=segment.get('platform_segment_id', segment['id']),
                     scope="account-specific" if account_id else "platform-wide",
                     is_live=True,  # Platform adapter segments are assumed live
-                    deployed_at=datetime.now().isoformat(),
                     estimated_activation_duration_minutes=15
                 )]
         else:
             # This is a database segment - get platform deployments as before
             cursor.execute("""
-                SELECT * FROM platform_deployments
+                SELECT platform, account, is_live, scope,
+                       decisioning_platform_segment_id, estimated_activation_duration_minutes
+                FROM platform_deployments
                 WHERE signals_agent_segment_id = ?
             """, (segment['id'],))
             deployments = [dict(row) for row in cursor.fetchall()]
@@ -826,7 +989,7 @@ def get_signals(
             # Filter deployments based on requested platforms
             if isinstance(deliver_to.platforms, str) and deliver_to.platforms == "all":
                 # Return all deployments
-                platform_deployments = [PlatformDeployment(**dep) for dep in deployments]
+                platform_deployments = [deployment_from_row(dep) for dep in deployments]
             else:
                 # Filter deployments by requested platforms
                 requested_platforms = set()
@@ -841,7 +1004,7 @@ def get_signals(
                 
                 for dep in deployments:
                     if dep['platform'] in requested_platforms:
-                        platform_deployments.append(PlatformDeployment(**dep))
+                        platform_deployments.append(deployment_from_row(dep))
         
         if platform_deployments:
             # Check for custom pricing for this principal
@@ -879,16 +1042,39 @@ def get_signals(
     # Clean up memory caches periodically
     cleanup_memory_caches()
     
+    # Custom proposals are built from the AI-ranked segments and only when
+    # some existing segment matched. The Gemini call runs on a worker thread
+    # while the discovery context is stored.
+    proposals_future = None
+    if signals:
+        proposals_future = _discovery_executor.submit(
+            generate_custom_segment_proposals, signal_spec, ranked_segments
+        )
+    
+    # Generate context ID
+    context_id = generate_context_id()
+    
+    # Store discovery context
+    signal_ids = [signal.signals_agent_segment_id for signal in signals]
+    search_parameters = {
+        "signal_spec": signal_spec,
+        "deliver_to": deliver_to.model_dump(),
+        "filters": filters.model_dump() if filters else None,
+        "max_results": max_results,
+        "principal_id": principal_id
+    }
+    store_discovery_context(context_id, signal_spec, principal_id, signal_ids, search_parameters)
+    
     # Generate custom segment proposals
     custom_proposals = []
-    if signals:  # Only generate proposals if we found some existing segments
-        proposal_data = generate_custom_segment_proposals(signal_spec, ranked_segments)
+    if proposals_future is not None:  # Only if we found some existing segments
+        proposal_data = proposals_future.result()
         for proposal in proposal_data:
             # Generate unique ID for custom segment
-            custom_id = f"custom_{len(custom_segments) + 1}_{hash(proposal['proposed_name']) % 10000}"
+            custom_id = generate_short_id("custom")
             
             # Store in memory for later activation
-            custom_segments[custom_id] = {
+            custom_segment = {
                 "id": custom_id,
                 "name": proposal['proposed_name'],
                 "description": f"Custom segment: {proposal.get('target_signals', proposal.get('target_audience', ''))}",
@@ -899,8 +1085,10 @@ def get_signals(
                 "revenue_share_percentage": 0.0,
                 "catalog_access": "personalized",
                 "creation_rationale": proposal['creation_rationale'],
-                "created_at": datetime.now().isoformat()
+                "created_at": current_timestamp()
             }
+            with _memory_cache_lock:
+                custom_segments[custom_id] = custom_segment
             
             # Add the custom ID to the proposal
             proposal_with_id = CustomSegmentProposal(
@@ -909,20 +1097,6 @@ def get_signals(
             )
             custom_proposals.append(proposal_with_id)
     
-    # Generate context ID
-    context_id = generate_context_id()
-    
-    # Store discovery context
-    signal_ids = [signal.signals_agent_segment_id for signal in signals]
-    search_parameters = {
-        "signal_spec": signal_spec,
-        "deliver_to": deliver_to.model_dump(),
-        "filters": filters.model_dump() if filters else None,
-        "max_results": max_results,
-        "principal_id": principal_id
-    }
-    store_discovery_context(context_id, signal_spec, principal_id, signal_ids, search_parameters)
-    
     # Generate human-readable message
     message = generate_discovery_message(signal_spec, signals, custom_proposals)
     
@@ -954,15 +1128,16 @@ def activate_signal(
     
     # Check if this is a custom segment
     if signals_agent_segment_id.startswith("custom_"):
-        if signals_agent_segment_id not in custom_segments:
+        with _memory_cache_lock:
+            segment = custom_segments.get(signals_agent_segment_id)
+        if segment is None:
             raise ValueError(f"Custom segment '{signals_agent_segment_id}' not found")
         
-        segment = custom_segments[signals_agent_segment_id]
-        
         # Check if already activated
         activation_key = f"{signals_agent_segment_id}_{platform}_{account or 'default'}"
-        if activation_key in segment_activations:
-            existing = segment_activations[activation_key]
+        with _memory_cache_lock:
+            existing = segment_activations.get(activation_key)
+        if existing is not None:
             if existing.get('status') == 'deployed':
                 # Already deployed - return current status
                 activation_context_id = store_activation_context(context_id, signals_agent_segment_id, platform, account)
@@ -979,9 +1154,10 @@ def activate_signal(
                 estimated_completion = datetime.fromisoformat(existing['estimated_completion'])
                 if datetime.now() >= estimated_completion:
                     # Mark as deployed
-                    existing['status'] = 'deployed'
-                    existing['deployed_at'] = datetime.now().isoformat()
-                    segment_activations[activation_key] = existing
+                    with _memory_cache_lock:
+                        existing['status'] = 'deployed'
+                        existing['deployed_at'] = datetime.now().isoformat()
+                        segment_activations[activation_key] = existing
                     
                     console.print(f"[bold green]Custom segment '{signals_agent_segment_id}' is now live on {platform}[/bold green]")
                     
@@ -1013,7 +1189,7 @@ def activate_signal(
         activation_duration = 120  # Custom segments take longer to create
         
         # Store activation record
-        segment_activations[activation_key] = {
+        activation = {
             "signals_agent_segment_id": signals_agent_segment_id,
             "platform": platform,
             "account": account,
@@ -1022,6 +1198,8 @@ def activate_signal(
             "activation_started_at": datetime.now().isoformat(),
             "estimated_completion": (datetime.now() + timedelta(minutes=activation_duration)).isoformat()
         }
+        with _memory_cache_lock:
+            segment_activations[activation_key] = activation
         
         console.print(f"[bold cyan]Creating and activating custom segment '{segment['name']}' on {platform}[/bold cyan]")
         console.print(f"[dim]This involves building the segment from scratch, estimated duration: {activation_duration} minutes[/dim]")
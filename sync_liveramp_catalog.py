@@ -12,7 +12,7 @@ Options:
 
 import sys
 import os
-import json
+import orjson
 import sqlite3
 import requests
 import time
@@ -21,6 +21,11 @@ from datetime import datetime
 from typing import List, Dict, Any
 from config_loader import load_config
 from embeddings import EmbeddingsManager
+from database import (
+    pack_raw_data, unpack_raw_data, liveramp_segment_cpm,
+    ensure_liveramp_provider_counts, refresh_liveramp_provider_counts,
+    LIVERAMP_CATEGORIES_TABLE_SQL
+)
 
 
 class LiveRampCatalogSync:
@@ -64,7 +69,7 @@ class LiveRampCatalogSync:
         token_data = response.json()
         self.auth_token = token_data.get('access_token')
         expires_in = token_data.get('expires_in', 3600)
-        self.token_expires_at = datetime.now().timestamp() + expires_in
+        self.token_expires_at = time.time() + expires_in
         
         print("✓ Authentication successful")
     
@@ -72,7 +77,7 @@ class LiveRampCatalogSync:
         """Check if token is still valid."""
         if not self.auth_token or not self.token_expires_at:
             return False
-        return datetime.now().timestamp() < (self.token_expires_at - 300)
+        return time.time() < (self.token_expires_at - 300)
     
     def fetch_all_segments(self, max_segments: int = None, incremental: bool = False, write_callback=None) -> List[Dict]:
         """Fetch all segments from LiveRamp with pagination.
@@ -99,6 +104,7 @@ class LiveRampCatalogSync:
         page = 0
         # LiveRamp API maximum is 100 per page
         limit = 100  # Maximum allowed by LiveRamp API
+        page_delay = float(self.lr_config.get('page_delay_seconds', 0))
         
         # Check for last sync time if incremental
         last_sync_time = None
@@ -118,95 +124,100 @@ class LiveRampCatalogSync:
         
         print(f"Fetching segments from LiveRamp Data Marketplace (page size: {limit})...")
         
-        while True:
-            # Re-authenticate if token expired during sync
-            if not self.is_token_valid():
-                self.authenticate()
-                headers['Authorization'] = f'Bearer {self.auth_token}'
-            
-            params = {'limit': limit}
-            if after_cursor:
-                params['after'] = after_cursor
-            
-            try:
-                response = requests.get(segments_url, headers=headers, params=params, timeout=30)
+        # Reuse one pooled connection for every page instead of a new TLS
+        # handshake per request
+        with requests.Session() as session:
+            while True:
+                # Re-authenticate if token expired during sync
+                if not self.is_token_valid():
+                    self.authenticate()
+                    headers['Authorization'] = f'Bearer {self.auth_token}'
                 
-                if response.status_code == 429:  # Rate limited
-                    wait_time = int(response.headers.get('Retry-After', 60))
-                    print(f"Rate limited, waiting {wait_time} seconds...")
-                    time.sleep(wait_time)
-                    continue
+                params = {'limit': limit}
+                if after_cursor:
+                    params['after'] = after_cursor
                 
-                if response.status_code != 200:
-                    print(f"Error fetching page {page + 1}: {response.status_code}")
+                try:
+                    response = session.get(segments_url, headers=headers, params=params, timeout=30)
+                    
+                    if response.status_code == 429:  # Rate limited
+                        wait_time = int(response.headers.get('Retry-After', 60))
+                        print(f"Rate limited, waiting {wait_time} seconds...")
+                        time.sleep(wait_time)
+                        continue
+                    
+                    if response.status_code != 200:
+                        print(f"Error fetching page {page + 1}: {response.status_code}")
+                        if page > 0:  # Continue if we already have some data
+                            break
+                        raise Exception(f"Failed to fetch segments: {response.status_code} {response.text}")
+                    
+                    data = orjson.loads(response.content)
+                    segments = data.get('v3_Segments', [])
+                    
+                    if not segments:
+                        print(f"No more segments at page {page + 1}")
+                        break
+                    
+                    # Filter by update time if incremental
+                    if incremental and last_sync_time:
+                        filtered_segments = []
+                        for seg in segments:
+                            # Check if segment has an update timestamp
+                            updated_at = seg.get('updatedAt') or seg.get('updated_at') or seg.get('lastModified')
+                            if updated_at and updated_at > last_sync_time:
+                                filtered_segments.append(seg)
+                        segments = filtered_segments
+                        if not segments:
+                            print(f"  Page {page + 1}: No new segments (skipping)")
+                            page += 1
+                            continue
+                    
+                    # Write segments incrementally if callback provided
+                    if write_callback:
+                        write_callback(segments)
+                        print(f"  Page {page + 1}: Wrote {len(segments)} segments (total processed: {len(all_segments) + len(segments)})")
+                    else:
+                        all_segments.extend(segments)
+                        print(f"  Page {page + 1}: Retrieved {len(segments)} segments (total: {len(all_segments)})")
+                    
+                    # Track all segments even if written incrementally
+                    if write_callback:
+                        all_segments.extend(segments)  # Still track for count
+                    
+                    # Get next cursor
+                    pagination = data.get('_pagination', {})
+                    after_cursor = pagination.get('after')
+                    
+                    # Check if we've reached the limit
+                    if max_segments and len(all_segments) >= max_segments:
+                        print(f"Reached limit of {max_segments} segments")
+                        if not write_callback:
+                            all_segments = all_segments[:max_segments]
+                        break
+                    
+                    # If no cursor, we've reached the end
+                    if not after_cursor:
+                        print("Reached end of catalog")
+                        break
+                    
+                    page += 1
+                    
+                    # Optional pacing between pages; off by default since 429s
+                    # are already handled above via Retry-After
+                    if page_delay:
+                        time.sleep(page_delay)
+                    
+                except requests.exceptions.Timeout:
+                    print(f"Timeout on page {page + 1}, retrying...")
+                    time.sleep(5)
+                    continue
+                    
+                except Exception as e:
+                    print(f"Error on page {page + 1}: {e}")
                     if page > 0:  # Continue if we already have some data
                         break
-                    raise Exception(f"Failed to fetch segments: {response.status_code} {response.text}")
-                
-                data = response.json()
-                segments = data.get('v3_Segments', [])
-                
-                if not segments:
-                    print(f"No more segments at page {page + 1}")
-                    break
-                
-                # Filter by update time if incremental
-                if incremental and last_sync_time:
-                    filtered_segments = []
-                    for seg in segments:
-                        # Check if segment has an update timestamp
-                        updated_at = seg.get('updatedAt') or seg.get('updated_at') or seg.get('lastModified')
-                        if updated_at and updated_at > last_sync_time:
-                            filtered_segments.append(seg)
-                    segments = filtered_segments
-                    if not segments:
-                        print(f"  Page {page + 1}: No new segments (skipping)")
-                        page += 1
-                        continue
-                
-                # Write segments incrementally if callback provided
-                if write_callback:
-                    write_callback(segments)
-                    print(f"  Page {page + 1}: Wrote {len(segments)} segments (total processed: {len(all_segments) + len(segments)})")
-                else:
-                    all_segments.extend(segments)
-                    print(f"  Page {page + 1}: Retrieved {len(segments)} segments (total: {len(all_segments)})")
-                
-                # Track all segments even if written incrementally
-                if write_callback:
-                    all_segments.extend(segments)  # Still track for count
-                
-                # Get next cursor
-                pagination = data.get('_pagination', {})
-                after_cursor = pagination.get('after')
-                
-                # Check if we've reached the limit
-                if max_segments and len(all_segments) >= max_segments:
-                    print(f"Reached limit of {max_segments} segments")
-                    if not write_callback:
-                        all_segments = all_segments[:max_segments]
-                    break
-                
-                # If no cursor, we've reached the end
-                if not after_cursor:
-                    print("Reached end of catalog")
-                    break
-                
-                page += 1
-                
-                # Rate limiting - be nice to the API
-                time.sleep(0.5)
-                
-            except requests.exceptions.Timeout:
-                print(f"Timeout on page {page + 1}, retrying...")
-                time.sleep(5)
-                continue
-                
-            except Exception as e:
-                print(f"Error on page {page + 1}: {e}")
-                if page > 0:  # Continue if we already have some data
-                    break
-                raise
+                    raise
         
         return all_segments
     
@@ -225,17 +236,32 @@ class LiveRampCatalogSync:
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
+        # Bulk-load settings: fsync only at WAL checkpoints, keep temp data
+        # and a large page cache in memory
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA cache_size=-262144")
+        cursor.execute("PRAGMA mmap_size=30000000000")
+        
         try:
             # Begin transaction for atomic operations
             cursor.execute("BEGIN EXCLUSIVE TRANSACTION")
             
+            # FTS rows are written in one batch below; databases created
+            # before that still carry the per-row trigger, so drop it
+            cursor.execute("DROP TRIGGER IF EXISTS liveramp_segments_ai")
+            cursor.execute(LIVERAMP_CATEGORIES_TABLE_SQL.format(table='liveramp_segment_categories'))
+            
             # Only clear if not appending
             if not append:
                 cursor.execute("DELETE FROM liveramp_segments")
                 cursor.execute("DELETE FROM liveramp_segments_fts")
+                cursor.execute("DELETE FROM liveramp_segment_categories")
             
             # Prepare batch insert data
             segment_data = []
+            category_data = []
             
             for segment in segments:
                 segment_id = str(segment.get('id'))
@@ -252,129 +278,29 @@ class LiveRampCatalogSync:
                     if isinstance(input_records, dict):
                         reach_count = input_records.get('count')
                 
-                # Extract pricing (Enhanced to check multiple locations)
-                has_pricing = False
-                cpm_price = None
-                
-                # Method 1: Check subscriptions (most common)
-                subscriptions = segment.get('subscriptions', [])
-                if subscriptions and isinstance(subscriptions, list):
-                    for sub in subscriptions:
-                        if isinstance(sub, dict):
-                            # Check price object
-                            price_obj = sub.get('price', {})
-                            if isinstance(price_obj, dict):
-                                # Try different price fields
-                                for price_field in ['cpm', 'CPM', 'value', 'Value', 'amount', 'cost']:
-                                    price_val = price_obj.get(price_field)
-                                    if price_val is not None:
-                                        try:
-                                            cpm_price = float(price_val)
-                                            has_pricing = True
-                                            break
-                                        except (ValueError, TypeError):
-                                            pass
-                            
-                            # Check subscription root for direct pricing
-                            if not has_pricing:
-                                for field in ['cpm', 'CPM', 'price', 'cost', 'fee']:
-                                    if field in sub and sub[field] is not None:
-                                        try:
-                                            cpm_price = float(sub[field])
-                                            has_pricing = True
-                                            break
-                                        except (ValueError, TypeError):
-                                            pass
-                        
-                        if has_pricing:
-                            break
-                
-                # Method 2: Check root level pricing fields
-                if not has_pricing:
-                    for field in ['price', 'pricing', 'cpm', 'CPM', 'cost', 'fee']:
-                        if field in segment:
-                            val = segment[field]
-                            if isinstance(val, (int, float)):
-                                try:
-                                    cpm_price = float(val)
-                                    has_pricing = True
-                                    break
-                                except (ValueError, TypeError):
-                                    pass
-                            elif isinstance(val, dict):
-                                for subfield in ['cpm', 'CPM', 'value', 'amount']:
-                                    if subfield in val and val[subfield] is not None:
-                                        try:
-                                            cpm_price = float(val[subfield])
-                                            has_pricing = True
-                                            break
-                                        except (ValueError, TypeError):
-                                            pass
-                                if has_pricing:
-                                    break
-                
-                # Method 3: Check 'pricing' field (LiveRamp specific structure)
-                if not has_pricing:
-                    pricing_obj = segment.get('pricing', {})
-                    if pricing_obj:
-                        # Try digitalAdTargeting first (most common for programmatic)
-                        if 'digitalAdTargeting' in pricing_obj:
-                            dat = pricing_obj['digitalAdTargeting']
-                            if 'value' in dat and 'amount' in dat['value']:
-                                amount = dat['value']['amount']
-                                unit = dat['value'].get('unit', 'CENTS')
-                                if unit == 'CENTS':
-                                    cpm_price = amount / 100.0  # Convert cents to dollars
-                                else:
-                                    cpm_price = float(amount)
-                                has_pricing = True
-                        
-                        # Fallback to tvTargeting
-                        if not has_pricing and 'tvTargeting' in pricing_obj:
-                            tv = pricing_obj['tvTargeting']
-                            if 'value' in tv and 'amount' in tv['value']:
-                                amount = tv['value']['amount']
-                                unit = tv['value'].get('unit', 'CENTS')
-                                if unit == 'CENTS':
-                                    cpm_price = amount / 100.0
-                                else:
-                                    cpm_price = float(amount)
-                                has_pricing = True
-                        
-                        # Fallback to contentMarketing
-                        if not has_pricing and 'contentMarketing' in pricing_obj:
-                            cm = pricing_obj['contentMarketing']
-                            if 'value' in cm and 'amount' in cm['value']:
-                                amount = cm['value']['amount']
-                                unit = cm['value'].get('unit', 'CENTS')
-                                if unit == 'CENTS':
-                                    cpm_price = amount / 100.0
-                                else:
-                                    cpm_price = float(amount)
-                                has_pricing = True
-                
-                # Method 4: Check if marked as free
-                if not has_pricing:
-                    if segment.get('isFree') or segment.get('is_free') or segment.get('free'):
-                        cpm_price = 0.0
-                        has_pricing = True
+                # Extract pricing
+                cpm_price = liveramp_segment_cpm(segment)
+                has_pricing = cpm_price is not None
                 
                 # Extract categories
                 categories = []
-                for cat in segment.get('categories', []):
+                for cat in segment.get('categories', ()):
                     if isinstance(cat, dict):
                         categories.append(cat.get('name', ''))
                     else:
                         categories.append(str(cat))
                 categories_str = ', '.join(categories)
+                category_data.extend((category, segment_id) for category in categories if category)
                 
                 segment_data.append((
                     segment_id, name, description, provider, segment_type,
                     reach_count, has_pricing, cpm_price, categories_str,
-                    json.dumps(segment)
+                    pack_raw_data(segment)
                 ))
             
             # Batch insert with conflict resolution for incremental updates
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM liveramp_segments")
+            last_id = cursor.fetchone()[0]
             cursor.executemany('''
                 INSERT OR REPLACE INTO liveramp_segments (
                     segment_id, name, description, provider_name, segment_type,
@@ -382,6 +308,29 @@ class LiveRampCatalogSync:
                 ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))
             ''', segment_data)
             
+            # Index the new rows in one statement instead of one trigger per row
+            cursor.execute('''
+                INSERT INTO liveramp_segments_fts(
+                    rowid, name, description, provider_name, categories
+                )
+                SELECT id, name, description, provider_name, categories
+                FROM liveramp_segments
+                WHERE id > ?
+            ''', (last_id,))
+            
+            # Category lookup rows come from the parsed list, not the joined
+            # text, since a category name can itself contain ', '. Replaced
+            # segments drop their old rows first.
+            if append:
+                cursor.executemany(
+                    "DELETE FROM liveramp_segment_categories WHERE segment_id = ?",
+                    [(row[0],) for row in segment_data]
+                )
+            cursor.executemany(
+                "INSERT OR IGNORE INTO liveramp_segment_categories (category, segment_id) VALUES (?, ?)",
+                category_data
+            )
+            
             # Commit transaction
             conn.commit()
             print(f"✓ Stored {len(segments)} segments successfully")
@@ -429,6 +378,11 @@ class LiveRampCatalogSync:
                 SET sync_completed = ?, total_segments = ?, status = ?, error_message = ?
                 WHERE id = (SELECT MAX(id) FROM liveramp_sync_status)
             ''', (datetime.now().isoformat(), total_segments, status, error))
+            
+            # The catalog is complete; recount segments per provider
+            if status == 'success':
+                ensure_liveramp_provider_counts(cursor)
+                refresh_liveramp_provider_counts(cursor)
         
         conn.commit()
         conn.close()
@@ -475,12 +429,14 @@ class LiveRampCatalogSync:
         cursor.execute('SELECT COUNT(*) FROM liveramp_segments WHERE reach_count IS NOT NULL')
         stats['segments_with_reach'] = cursor.fetchone()[0]
         
-        # Top providers
+        # Top providers, from the counts summarized at sync time. A catalog
+        # last synced before that table existed gets it built here.
+        ensure_liveramp_provider_counts(cursor)
+        conn.commit()
         cursor.execute('''
-            SELECT provider_name, COUNT(*) as count 
-            FROM liveramp_segments 
-            GROUP BY provider_name 
-            ORDER BY count DESC 
+            SELECT provider_name, cnt as count 
+            FROM liveramp_provider_counts 
+            ORDER BY cnt DESC 
             LIMIT 10
         ''')
         stats['top_providers'] = cursor.fetchall()
@@ -682,7 +638,7 @@ def main():
             conn = sqlite3.connect(syncer.db_path)
             cursor = conn.cursor()
             cursor.execute('SELECT raw_data FROM liveramp_segments')
-            segments = [json.loads(row[0]) for row in cursor.fetchall()]
+            segments = [unpack_raw_data(row[0]) for row in cursor.fetchall()]
             conn.close()
             
             if segments:
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+"""Tests for the search API server."""
+
+import asyncio
+import os
+import sqlite3
+import sys
+import unittest
+from unittest.mock import patch, AsyncMock, MagicMock
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+import app_server
+
+
+class TestSearchResponseCache(unittest.TestCase):
+    """Test the short-lived cache of encoded /api/search responses."""
+    
+    def setUp(self):
+        """Start every test from an empty cache."""
+        app_server._search_cache.clear()
+        self.addCleanup(app_server._search_cache.clear)
+        self.client = TestClient(app_server.app)
+    
+    def test_cached_body_is_returned_until_ttl(self):
+        """Test that a stored body is served until it is older than the TTL."""
+        key = ('finance', 'fts', 20, None, None, False, False)
+        with patch('app_server.time.time', return_value=1000.0):
+            app_server._set_cached_search(key, b'{"results":[]}')
+        
+        with patch('app_server.time.time', return_value=1000.0 + app_server.SEARCH_CACHE_TTL_SECONDS - 1):
+            self.assertEqual(app_server._get_cached_search(key), b'{"results":[]}')
+        
+        with patch('app_server.time.time', return_value=1000.0 + app_server.SEARCH_CACHE_TTL_SECONDS):
+            self.assertIsNone(app_server._get_cached_search(key))
+        self.assertNotIn(key, app_server._search_cache)
+    
+    def test_full_cache_evicts_oldest_entry(self):
+        """Test that a full cache drops its oldest insertion for a new key."""
+        with patch.object(app_server, 'SEARCH_CACHE_MAX_ENTRIES', 2):
+            app_server._set_cached_search(('a',), b'1')
+            app_server._set_cached_search(('b',), b'2')
+            app_server._set_cached_search(('c',), b'3')
+        
+        self.assertEqual(list(app_server._search_cache), [('b',), ('c',)])
+    
+    def test_identical_searches_run_once(self):
+        """Test that a repeated query is answered from the cache."""
+        run_search = AsyncMock(return_value=b'{"results":[]}')
+        with patch.object(app_server, 'liveramp_adapter', object()), \
+             patch.object(app_server, '_run_search', run_search):
+            first = self.client.get('/api/search', params={'q': 'finance', 'mode': 'fts'})
+            second = self.client.get('/api/search', params={'q': 'finance', 'mode': 'fts'})
+            other = self.client.get('/api/search', params={'q': 'finance', 'mode': 'fts', 'limit': 5})
+        
+        self.assertEqual(first.content, b'{"results":[]}')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(other.status_code, 200)
+        # The second request hit the cache; a different limit is a new key
+        self.assertEqual(run_search.await_count, 2)
+
+
+class TestSearchCoalescing(unittest.TestCase):
+    """Test that concurrent identical searches share one in-flight run."""
+    
+    def setUp(self):
+        """Start every test with no cached or running searches."""
+        app_server._search_cache.clear()
+        app_server._searches_in_flight.clear()
+        self.addCleanup(app_server._search_cache.clear)
+        self.calls = 0
+    
+    def fake_run_search(self, body=b'{"results":[]}', error=None):
+        """Build a _run_search stand-in that counts its runs."""
+        async def run_search(*args):
+            self.calls += 1
+            await asyncio.sleep(0.05)
+            if error is not None:
+                raise error
+            return body
+        return run_search
+    
+    def search(self, q='finance'):
+        """Call the endpoint function with every parameter spelled out."""
+        return app_server.search_api(q=q, mode='fts', limit=20, rag_weight=0.7, fusion='weighted',
+                                     rerank=False, expand_query=False)
+    
+    def test_concurrent_duplicates_share_one_run(self):
+        """Test that a duplicate arriving mid-run awaits the first run."""
+        async def run():
+            return await asyncio.gather(self.search(), self.search(), self.search('travel'))
+        
+        with patch.object(app_server, 'liveramp_adapter', object()), \
+             patch.object(app_server, '_run_search', self.fake_run_search()):
+            first, second, other = asyncio.run(run())
+        
+        self.assertEqual(first.body, b'{"results":[]}')
+        self.assertEqual(second.body, first.body)
+        self.assertEqual(other.status_code, 200)
+        # The duplicate joined the first run; a different query ran its own
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(app_server._searches_in_flight, {})
+    
+    def test_errors_reach_every_waiter_and_are_not_cached(self):
+        """Test that a failed run fails its waiters and the next search retries."""
+        async def run():
+            return await asyncio.gather(self.search(), self.search(), return_exceptions=True)
+        
+        with patch.object(app_server, 'liveramp_adapter', object()), \
+             patch.object(app_server, '_run_search', self.fake_run_search(error=RuntimeError('boom'))):
+            results = asyncio.run(run())
+        
+        self.assertEqual(len(results), 2)
+        for result in results:
+            self.assertIsInstance(result, RuntimeError)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(app_server._searches_in_flight, {})
+        self.assertEqual(len(app_server._search_cache), 0)
+        
+        with patch.object(app_server, 'liveramp_adapter', object()), \
+             patch.object(app_server, '_run_search', self.fake_run_search()):
+            response = asyncio.run(self.search())
+        self.assertEqual(response.body, b'{"results":[]}')
+        self.assertEqual(self.calls, 2)
+
+
+class TestRerank(unittest.TestCase):
+    """Test the optional cross-encoder reranking of search results."""
+    
+    def setUp(self):
+        """Build more results than the reranker scores."""
+        self.results = [{'segment_id': i, 'name': f'segment {i}'} for i in range(app_server.RERANK_CANDIDATES + 5)]
+    
+    def test_reranks_candidates_and_keeps_the_tail(self):
+        """Test that the top candidates are reordered and the rest follow."""
+        reranker = MagicMock()
+        # Score the candidates in reverse order of their search rank
+        reranker.predict.side_effect = lambda pairs, batch_size: list(range(len(pairs)))
+        with patch.object(app_server, '_get_reranker', return_value=reranker):
+            reranked = app_server._rerank_results('cars', self.results)
+        
+        candidates = self.results[:app_server.RERANK_CANDIDATES]
+        self.assertEqual(reranked[:app_server.RERANK_CANDIDATES], candidates[::-1])
+        self.assertEqual(reranked[app_server.RERANK_CANDIDATES:], self.results[app_server.RERANK_CANDIDATES:])
+    
+    def test_missing_reranker_returns_results_unchanged(self):
+        """Test that results pass through when no reranker is available."""
+        with patch.object(app_server, '_get_reranker', return_value=None):
+            self.assertEqual(app_server._rerank_results('cars', self.results), self.results)
+    
+    def test_model_load_failure_falls_back(self):
+        """Test that a model that fails to load is reported as unavailable."""
+        with patch.object(app_server, '_load_reranker', side_effect=OSError('download failed')), \
+             patch('builtins.print'):
+            self.assertIsNone(app_server._get_reranker())
+            self.assertEqual(app_server._rerank_results('cars', self.results), self.results)
+    
+    def test_search_without_reranker_returns_results(self):
+        """Test that a reranked search still answers when reranking is unavailable."""
+        adapter = MagicMock()
+        adapter.search_segments.return_value = self.results
+        app_server._search_cache.clear()
+        self.addCleanup(app_server._search_cache.clear)
+        with patch.object(app_server, 'liveramp_adapter', adapter), \
+             patch.object(app_server, '_get_reranker', return_value=None):
+            response = TestClient(app_server.app).get(
+                '/api/search', params={'q': 'cars', 'mode': 'fts', 'limit': 3, 'rerank': 'true'}
+            )
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['id'] for r in response.json()['results']], [0, 1, 2])
+
+
+
+class TestCollectStats(unittest.TestCase):
+    """Test the database statistics behind /api/stats."""
+    
+    def test_reports_latest_sync(self):
+        """Test that the most recently recorded sync is reported."""
+        conn = sqlite3.connect(':memory:')
+        self.addCleanup(conn.close)
+        conn.row_factory = sqlite3.Row
+        conn.execute("CREATE TABLE liveramp_segments (id INTEGER PRIMARY KEY)")
+        conn.execute("""
+            CREATE TABLE liveramp_sync_status (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sync_started TIMESTAMP,
+                status TEXT
+            )
+        """)
+        conn.execute("INSERT INTO liveramp_sync_status (sync_started, status) VALUES ('2024-01-02', 'success')")
+        conn.execute("INSERT INTO liveramp_sync_status (sync_started, status) VALUES ('2024-01-01', 'in_progress')")
+        
+        with patch.object(app_server, 'get_db_connection', return_value=conn), \
+             patch.object(app_server, 'liveramp_adapter', None):
+            stats = app_server._collect_stats()
+        
+        self.assertEqual(stats['database']['last_sync']['id'], 2)
+        self.assertEqual(stats['database']['last_sync']['status'], 'in_progress')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,11 @@
 
 import os
 import sys
+import json
+import shutil
 import sqlite3
+import tempfile
+import time
 import unittest
 from unittest.mock import patch, MagicMock
 
@@ -11,7 +15,12 @@ from unittest.mock import patch, MagicMock
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config_loader import load_config
-from adapters.liveramp import LiveRampAdapter
+from adapters.liveramp import LiveRampAdapter, RRF_K
+from sync_liveramp_catalog import LiveRampCatalogSync
+from database import (
+    pack_raw_data, unpack_raw_data, ensure_liveramp_fts, ensure_liveramp_categories,
+    liveramp_segment_cpm
+)
 
 
 class TestLiveRampIntegration(unittest.TestCase):
@@ -74,7 +83,12 @@ class TestLiveRampIntegration(unittest.TestCase):
         }
         mock_post.return_value = mock_response
         
-        adapter = LiveRampAdapter(self.lr_config)
+        # Keep tokens cached by other runs out of the test
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        token_cache_path = os.path.join(tmp_dir, 'token.json')
+        
+        adapter = LiveRampAdapter(dict(self.lr_config, token_cache_path=token_cache_path))
         result = adapter.authenticate()
         
         self.assertEqual(result['access_token'], 'test_token')
@@ -150,6 +164,580 @@ class TestLiveRampIntegration(unittest.TestCase):
         self.assertLessEqual(len(results), 200)
 
 
+class TestRawDataPacking(unittest.TestCase):
+    """Test the compressed encoding of liveramp_segments.raw_data."""
+    
+    def setUp(self):
+        """Build a segment shaped like a LiveRamp catalog entry."""
+        self.segment = {
+            'id': 'seg_1',
+            'name': 'Auto Intenders – Luxury',
+            'description': 'In-market luxury vehicle shoppers. ' * 20,
+            'categories': ['Auto', 'Luxury'],
+            'reach': {'count': 1200000},
+            'price': None
+        }
+    
+    def test_round_trip(self):
+        """Test that a packed segment decodes to the same dict."""
+        packed = pack_raw_data(self.segment)
+        
+        self.assertIsInstance(packed, bytes)
+        self.assertEqual(unpack_raw_data(packed), self.segment)
+    
+    def test_packed_data_is_compressed(self):
+        """Test that packing shrinks repetitive segment JSON."""
+        self.assertLess(len(pack_raw_data(self.segment)), len(json.dumps(self.segment)))
+    
+    def test_legacy_text_is_decoded(self):
+        """Test that rows written before compression still decode."""
+        self.assertEqual(unpack_raw_data(json.dumps(self.segment)), self.segment)
+    
+    def test_round_trip_through_sqlite(self):
+        """Test that packed data survives a BLOB column unchanged."""
+        conn = sqlite3.connect(':memory:')
+        conn.execute("CREATE TABLE segments (raw_data BLOB)")
+        conn.execute("INSERT INTO segments VALUES (?)", (pack_raw_data(self.segment),))
+        raw_data = conn.execute("SELECT raw_data FROM segments").fetchone()[0]
+        conn.close()
+        
+        self.assertEqual(unpack_raw_data(raw_data), self.segment)
+
+
+class TestSegmentCpm(unittest.TestCase):
+    """Test reading a CPM out of the price fields of a raw catalog segment."""
+    
+    def test_subscription_price_comes_first(self):
+        """Test that a subscription price wins over the other locations."""
+        segment = {
+            'subscriptions': [{'price': {'value': '1.75'}}],
+            'pricing': {'digitalAdTargeting': {'value': {'amount': 250}}}
+        }
+        self.assertEqual(liveramp_segment_cpm(segment), 1.75)
+    
+    def test_unparseable_fields_are_skipped(self):
+        """Test that a non-numeric candidate falls through to the next field."""
+        segment = {'subscriptions': ['bad', {'price': {'cpm': 'n/a'}, 'fee': 3}]}
+        self.assertEqual(liveramp_segment_cpm(segment), 3.0)
+    
+    def test_root_fields(self):
+        """Test numeric and object prices at the segment root."""
+        self.assertEqual(liveramp_segment_cpm({'cpm': 2}), 2.0)
+        self.assertEqual(liveramp_segment_cpm({'price': {'amount': '4.5'}}), 4.5)
+    
+    def test_pricing_blocks(self):
+        """Test the pricing blocks, converting cents to dollars."""
+        self.assertEqual(liveramp_segment_cpm({'pricing': {'digitalAdTargeting': {'value': {'amount': 250}}}}), 2.5)
+        self.assertEqual(liveramp_segment_cpm({'pricing': {'tvTargeting': {'value': {'amount': 6, 'unit': 'USD'}}}}), 6.0)
+    
+    def test_free_and_unpriced_segments(self):
+        """Test that a free flag is a zero CPM and no price at all is None."""
+        self.assertEqual(liveramp_segment_cpm({'isFree': True}), 0.0)
+        self.assertIsNone(liveramp_segment_cpm({'name': 'Pet Owners', 'subscriptions': []}))
+
+
+class TestCatalogSync(unittest.TestCase):
+    """Test the staged catalog sync against a temporary database."""
+    
+    def setUp(self):
+        """Create an adapter whose cache lives in a temporary directory."""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        self.db_path = os.path.join(tmp_dir, 'signals_agent.db')
+        self.adapter = LiveRampAdapter({
+            'client_id': 'test',
+            'secret_key': 'test',
+            'account_id': 'test_account',
+            'cache_db_path': self.db_path,
+            'token_cache_path': os.path.join(tmp_dir, 'token.json')
+        })
+        self.adapter.auth_token = 'test_token'
+        patcher = patch.object(self.adapter, 'authenticate')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    @staticmethod
+    def make_segment(segment_id, name, categories=('Auto',)):
+        """Build a raw catalog segment."""
+        return {
+            'id': segment_id,
+            'name': name,
+            'description': f'{name} audience',
+            'providerName': 'Test Provider',
+            'categories': [{'name': category} for category in categories]
+        }
+    
+    @staticmethod
+    def make_page(segments, after=None):
+        """Build a catalog API response holding one page of segments."""
+        response = MagicMock()
+        response.status_code = 200
+        response.content = json.dumps({
+            'v3_Segments': segments,
+            '_pagination': {'after': after}
+        }).encode()
+        return response
+    
+    def sync(self, *pages):
+        """Run a forced sync that receives the given pages in order."""
+        with patch('adapters.liveramp.requests.Session.get', side_effect=list(pages)):
+            return self.adapter.sync_all_segments(force_refresh=True)
+    
+    def count_segments(self, conn):
+        """Count the catalog rows visible to a connection."""
+        return conn.execute("SELECT COUNT(*) FROM liveramp_segments").fetchone()[0]
+    
+    def table_exists(self, name):
+        """Check the schema for a table."""
+        conn = sqlite3.connect(self.db_path)
+        row = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        ).fetchone()
+        conn.close()
+        return row is not None
+    
+    def test_sync_loads_every_page(self):
+        """Test that all pages are stored and indexed for search."""
+        result = self.sync(
+            self.make_page([self.make_segment(1, 'Luxury Car Buyers')], after='page2'),
+            self.make_page([self.make_segment(2, 'Pet Owners')])
+        )
+        
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['total_segments'], 2)
+        self.assertFalse(self.table_exists('liveramp_segments_staging'))
+        self.assertEqual([r['id'] for r in self.adapter.search_segments('luxury')], ['1'])
+    
+    def test_resync_while_reader_is_open(self):
+        """Test that a reader keeps its snapshot while a re-sync swaps tables."""
+        self.sync(self.make_page([self.make_segment(1, 'Luxury Car Buyers')]))
+        
+        reader = sqlite3.connect(self.db_path, isolation_level=None)
+        self.addCleanup(reader.close)
+        reader.execute("BEGIN")
+        self.assertEqual(self.count_segments(reader), 1)
+        
+        result = self.sync(self.make_page([
+            self.make_segment(2, 'Pet Owners'),
+            self.make_segment(3, 'Frequent Travelers')
+        ]))
+        
+        self.assertEqual(result['total_segments'], 2)
+        # The open read transaction still sees the previous catalog
+        self.assertEqual(self.count_segments(reader), 1)
+        reader.execute("COMMIT")
+        self.assertEqual(self.count_segments(reader), 2)
+        self.assertEqual([r['id'] for r in self.adapter.search_segments('travelers')], ['3'])
+        self.assertEqual(self.adapter.search_segments('luxury'), [])
+    
+    def category_ids(self, category):
+        """Return the segment IDs found under a category."""
+        return sorted(s['id'] for s in self.adapter.get_segments_by_category(category))
+    
+    def test_category_lookup_uses_whole_names(self):
+        """Test that category names containing ', ' are looked up intact."""
+        self.sync(self.make_page([
+            self.make_segment(1, 'Luxury Car Buyers', ['Auto, Cars', 'Luxury']),
+            self.make_segment(2, 'Used Car Shoppers', ['Auto'])
+        ]))
+        
+        self.assertEqual(self.category_ids('Auto, Cars'), [1])
+        self.assertEqual(self.category_ids('auto'), [2])
+        self.assertEqual(self.category_ids('Cars'), [])
+        
+        # A re-sync replaces the lookup along with the catalog
+        self.sync(self.make_page([self.make_segment(3, 'Pet Owners', ['Pets'])]))
+        
+        self.assertEqual(self.category_ids('Auto, Cars'), [])
+        self.assertEqual(self.category_ids('Pets'), [3])
+        self.assertFalse(self.table_exists('liveramp_segment_categories_staging'))
+    
+    def test_category_lookup_is_backfilled(self):
+        """Test that a catalog stored without the lookup table gets one built."""
+        self.sync(self.make_page([self.make_segment(1, 'Luxury Car Buyers', ['Auto, Cars'])]))
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("DROP TABLE liveramp_segment_categories")
+        conn.commit()
+        
+        ensure_liveramp_categories(conn.cursor())
+        conn.commit()
+        conn.close()
+        
+        self.assertEqual(self.category_ids('Auto, Cars'), [1])
+    
+    def test_listing_reports_pricing_presence(self):
+        """Test that only segments with a stored CPM report pricing data."""
+        priced = self.make_segment(1, 'Luxury Car Buyers')
+        priced['pricing'] = {'digitalAdTargeting': {'value': {'amount': 250, 'unit': 'CENTS'}}}
+        self.sync(self.make_page([priced, self.make_segment(2, 'Pet Owners')]))
+        
+        segments = {s['platform_segment_id']: s for s in self.adapter.get_segments('test_account')}
+        
+        self.assertTrue(segments['1']['has_pricing_data'])
+        self.assertEqual(segments['1']['base_cpm'], 2.5)
+        self.assertFalse(segments['1']['is_free'])
+        self.assertFalse(segments['2']['has_pricing_data'])
+        self.assertEqual(segments['2']['base_cpm'], 0.0)
+    
+    def test_raw_and_summary_paths_agree_on_pricing(self):
+        """Test that a segment reports the same pricing from either normalization path."""
+        priced = self.make_segment(1, 'Luxury Car Buyers')
+        priced['pricing'] = {'digitalAdTargeting': {'value': {'amount': 250, 'unit': 'CENTS'}}}
+        free = self.make_segment(2, 'Pet Owners')
+        free['isFree'] = True
+        unpriced = self.make_segment(3, 'Frequent Travelers')
+        raw_segments = [priced, free, unpriced]
+        self.sync(self.make_page(raw_segments))
+        
+        from_columns = self.adapter.get_segments('test_account')
+        from_raw = self.adapter._normalize_segments(raw_segments, 'test_account')
+        
+        def pricing(segments):
+            return {
+                s['platform_segment_id']: (s['base_cpm'], s['is_free'], s['has_pricing_data'])
+                for s in segments
+            }
+        self.assertEqual(pricing(from_raw), pricing(from_columns))
+        self.assertEqual(pricing(from_raw), {
+            '1': (2.5, False, True),
+            '2': (0.0, True, True),
+            '3': (0.0, True, False)
+        })
+    
+    def test_segment_cache_follows_external_syncs(self):
+        """Test that decoded segments are dropped once another process records a sync."""
+        self.sync(self.make_page([self.make_segment(1, 'Luxury Car Buyers')]))
+        self.assertEqual(self.adapter.get_segment_by_id('1')['name'], 'Luxury Car Buyers')
+        
+        # Rewrite the row the way the sync script does, from another connection
+        conn = sqlite3.connect(self.db_path)
+        self.addCleanup(conn.close)
+        conn.execute(
+            "UPDATE liveramp_segments SET raw_data = ? WHERE segment_id = '1'",
+            (pack_raw_data(self.make_segment(1, 'Electric Car Buyers')),)
+        )
+        conn.commit()
+        
+        # No new sync is recorded yet, so the cached copy is still served
+        self.assertEqual(self.adapter.get_segment_by_id('1')['name'], 'Luxury Car Buyers')
+        
+        conn.execute(
+            "INSERT INTO liveramp_sync_status (sync_completed, total_segments, status) "
+            "VALUES ('2030-01-01T00:00:00', 1, 'success')"
+        )
+        conn.commit()
+        
+        self.assertEqual(self.adapter.get_segment_by_id('1')['name'], 'Electric Car Buyers')
+    
+    def test_failed_batch_rolls_back(self):
+        """Test that a batch that fails to store leaves the old catalog in place."""
+        self.sync(self.make_page([self.make_segment(1, 'Luxury Car Buyers')]))
+        
+        # A repeated segment_id violates the UNIQUE constraint mid-batch
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.sync(self.make_page([
+                self.make_segment(2, 'Pet Owners'),
+                self.make_segment(2, 'Pet Owners')
+            ]))
+        
+        self.assertFalse(self.table_exists('liveramp_segments_staging'))
+        self.assertFalse(self.table_exists('liveramp_segment_categories_staging'))
+        conn = sqlite3.connect(self.db_path)
+        self.addCleanup(conn.close)
+        self.assertEqual(self.count_segments(conn), 1)
+        self.assertEqual([r['id'] for r in self.adapter.search_segments('luxury')], ['1'])
+
+
+class TestTokenCache(unittest.TestCase):
+    """Test sharing auth tokens through the optional disk cache."""
+    
+    def setUp(self):
+        """Point the token cache at a temporary directory."""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        self.token_cache_path = os.path.join(tmp_dir, 'token.json')
+        self.config = {
+            'client_id': 'test',
+            'secret_key': 'test',
+            'account_id': 'test_account',
+            'cache_db_path': os.path.join(tmp_dir, 'signals_agent.db'),
+            'token_cache_path': self.token_cache_path
+        }
+    
+    def make_adapter(self, **overrides):
+        """Create an adapter with background token refresh disabled."""
+        adapter = LiveRampAdapter(dict(self.config, **overrides))
+        patcher = patch.object(adapter, '_schedule_token_refresh')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return adapter
+    
+    def write_cache(self, **fields):
+        """Write a token cache file for the test account."""
+        cached = {
+            'client_id': 'test',
+            'account_id': 'test_account',
+            'access_token': 'cached_token',
+            'expires_at': time.time() + 3600
+        }
+        cached.update(fields)
+        with open(self.token_cache_path, 'w') as f:
+            json.dump(cached, f)
+    
+    def mock_token_response(self, mock_post, token='fresh_token'):
+        """Make the token endpoint return the given token."""
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {'access_token': token, 'expires_in': 3600}
+        mock_post.return_value = mock_response
+    
+    @patch('adapters.liveramp.requests.post')
+    def test_fresh_token_is_saved(self, mock_post):
+        """Test that a newly issued token is written to the cache privately."""
+        self.mock_token_response(mock_post)
+        
+        adapter = self.make_adapter()
+        adapter.authenticate()
+        
+        with open(self.token_cache_path) as f:
+            cached = json.load(f)
+        self.assertEqual(cached['access_token'], 'fresh_token')
+        self.assertEqual(cached['client_id'], 'test')
+        self.assertEqual(cached['account_id'], 'test_account')
+        self.assertEqual(cached['expires_at'], adapter.token_expires_at)
+        self.assertEqual(os.stat(self.token_cache_path).st_mode & 0o777, 0o600)
+    
+    @patch('adapters.liveramp.requests.post')
+    def test_cached_token_is_loaded(self, mock_post):
+        """Test that a valid cached token is used without a token request."""
+        self.write_cache()
+        
+        result = self.make_adapter().authenticate()
+        
+        self.assertEqual(result['access_token'], 'cached_token')
+        mock_post.assert_not_called()
+    
+    @patch('adapters.liveramp.requests.post')
+    def test_expiring_token_is_not_loaded(self, mock_post):
+        """Test that a token inside the 300s refresh margin is replaced."""
+        self.write_cache(expires_at=time.time() + 120)
+        self.mock_token_response(mock_post)
+        
+        result = self.make_adapter().authenticate()
+        
+        self.assertEqual(result['access_token'], 'fresh_token')
+        mock_post.assert_called_once()
+    
+    @patch('adapters.liveramp.requests.post')
+    def test_other_account_token_is_not_loaded(self, mock_post):
+        """Test that a token cached for another account is ignored."""
+        self.write_cache(account_id='other_account')
+        self.mock_token_response(mock_post)
+        
+        result = self.make_adapter().authenticate()
+        
+        self.assertEqual(result['access_token'], 'fresh_token')
+        mock_post.assert_called_once()
+    
+    @patch('adapters.liveramp.requests.post')
+    def test_cache_is_off_without_path(self, mock_post):
+        """Test that no token file is read or written unless configured."""
+        self.write_cache()
+        self.mock_token_response(mock_post)
+        
+        adapter = self.make_adapter(token_cache_path=None)
+        result = adapter.authenticate()
+        
+        self.assertIsNone(adapter.token_cache_path)
+        self.assertEqual(result['access_token'], 'fresh_token')
+        with open(self.token_cache_path) as f:
+            self.assertEqual(json.load(f)['access_token'], 'cached_token')
+
+
+class TestSyncScriptStatistics(unittest.TestCase):
+    """Test the sync script's catalog statistics."""
+    
+    def setUp(self):
+        """Create a catalog written before the provider count summary existed."""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        self.db_path = os.path.join(tmp_dir, 'signals_agent.db')
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("""
+            CREATE TABLE liveramp_segments (
+                id INTEGER PRIMARY KEY,
+                provider_name TEXT,
+                has_pricing BOOLEAN,
+                reach_count INTEGER
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE liveramp_sync_status (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sync_completed TIMESTAMP,
+                total_segments INTEGER,
+                status TEXT
+            )
+        """)
+        conn.executemany(
+            "INSERT INTO liveramp_segments (provider_name, has_pricing, reach_count) VALUES (?, ?, ?)",
+            [('Acme', 1, 100), ('Acme', 0, None), ('Globex', 0, 50)]
+        )
+        conn.execute(
+            "INSERT INTO liveramp_sync_status (sync_completed, total_segments, status) "
+            "VALUES ('2024-01-01T00:00:00', 3, 'success')"
+        )
+        conn.commit()
+        conn.close()
+        
+        config = {'platforms': {'liveramp': {}}, 'database': {'path': self.db_path}}
+        with patch('sync_liveramp_catalog.load_config', return_value=config), \
+             patch.dict(os.environ, {'DATABASE_PATH': self.db_path}):
+            self.sync = LiveRampCatalogSync()
+    
+    def test_statistics_on_pre_upgrade_catalog(self):
+        """Test that statistics build the missing provider counts instead of failing."""
+        stats = self.sync.get_statistics()
+        
+        self.assertEqual(stats['total_segments'], 3)
+        self.assertEqual([tuple(row) for row in stats['top_providers']], [('Acme', 2), ('Globex', 1)])
+        self.assertEqual(stats['last_sync_status'], 'success')
+
+class TestFtsMigration(unittest.TestCase):
+    """Test moving an old liveramp_segments_fts index to the current schema."""
+    
+    def setUp(self):
+        """Create a catalog indexed with the old FTS schema."""
+        self.conn = sqlite3.connect(':memory:')
+        self.addCleanup(self.conn.close)
+        self.cursor = self.conn.cursor()
+        self.cursor.execute("""
+            CREATE TABLE liveramp_segments (
+                id INTEGER PRIMARY KEY,
+                segment_id TEXT UNIQUE NOT NULL,
+                name TEXT NOT NULL,
+                description TEXT,
+                provider_name TEXT,
+                categories TEXT
+            )
+        """)
+        self.cursor.executemany(
+            "INSERT INTO liveramp_segments (segment_id, name, description, provider_name, categories) "
+            "VALUES (?, ?, ?, ?, ?)",
+            [('1', 'Luxury Car Buyers', 'Shopping for cars', 'Test Provider', 'Auto'),
+             ('2', 'Pet Owners', 'Dog and cat owners', 'Test Provider', 'Pets')]
+        )
+        self.cursor.execute("""
+            CREATE VIRTUAL TABLE liveramp_segments_fts
+            USING fts5(
+                segment_id UNINDEXED,
+                name,
+                description,
+                provider_name,
+                categories,
+                content=liveramp_segments,
+                content_rowid=id
+            )
+        """)
+        self.cursor.execute("INSERT INTO liveramp_segments_fts(liveramp_segments_fts) VALUES('rebuild')")
+    
+    def match(self, query):
+        """Return the rowids matching an FTS query."""
+        self.cursor.execute(
+            "SELECT rowid FROM liveramp_segments_fts WHERE liveramp_segments_fts MATCH ? ORDER BY rowid",
+            (query,)
+        )
+        return [row[0] for row in self.cursor.fetchall()]
+    
+    def fts_sql(self):
+        """Return the stored definition of liveramp_segments_fts."""
+        self.cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'liveramp_segments_fts'")
+        return self.cursor.fetchone()[0]
+    
+    def test_old_index_is_rebuilt(self):
+        """Test that an index without prefix indexes is recreated and refilled."""
+        self.assertEqual(self.match('buyer'), [])
+        
+        with patch('builtins.print') as mock_print:
+            ensure_liveramp_fts(self.cursor)
+        
+        self.assertIn("prefix='2 3 4'", self.fts_sql())
+        self.assertNotIn('segment_id', self.fts_sql())
+        # Porter stemming and prefix queries work over the existing rows
+        self.assertEqual(self.match('buyer'), [1])
+        self.assertEqual(self.match('dog'), [2])
+        self.assertEqual(self.match('lux*'), [1])
+        self.assertIn('Migrating liveramp_segments_fts', mock_print.call_args_list[0][0][0])
+    
+    def test_current_index_is_kept(self):
+        """Test that an index already on the current schema is left alone."""
+        ensure_liveramp_fts(self.cursor)
+        
+        with patch('builtins.print') as mock_print:
+            ensure_liveramp_fts(self.cursor)
+        
+        mock_print.assert_not_called()
+        self.assertIn("prefix='2 3 4'", self.fts_sql())
+        self.assertEqual(self.match('buyer'), [1])
+
+
+class TestHybridFusion(unittest.TestCase):
+    """Test how search_segments_hybrid merges RAG and FTS results."""
+    
+    def setUp(self):
+        """Create an adapter with stubbed RAG and FTS searches."""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir, ignore_errors=True)
+        self.adapter = LiveRampAdapter({
+            'client_id': 'test',
+            'secret_key': 'test',
+            'cache_db_path': os.path.join(tmp_dir, 'signals_agent.db')
+        })
+        # RAG scores fall steeply; FTS relevance is on a different scale
+        self.adapter.embeddings_manager = MagicMock()
+        self.adapter.embeddings_manager.get_segments_with_embeddings.return_value = [
+            {'id': 'A', 'similarity_score': 0.99},
+            {'id': 'B', 'similarity_score': 0.20},
+            {'id': 'C', 'similarity_score': 0.10}
+        ]
+        patcher = patch.object(self.adapter, 'search_segments', return_value=[
+            {'id': 'C', 'relevance_score': -40.0},
+            {'id': 'D', 'relevance_score': -2.0}
+        ])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def ids(self, results):
+        """Return the result IDs in order."""
+        return [r['id'] for r in results]
+    
+    def test_rrf_ranks_by_position(self):
+        """Test that RRF sums 1 / (k + rank) over both lists."""
+        results = self.adapter.search_segments_hybrid('cars', limit=10, fusion='rrf')
+        
+        # C is in both lists; B and D tie at rank 2 and keep union order
+        self.assertEqual(self.ids(results), ['C', 'A', 'B', 'D'])
+        k = RRF_K
+        self.assertAlmostEqual(results[0]['combined_score'], 1 / (k + 3) + 1 / (k + 1))
+        self.assertAlmostEqual(results[1]['combined_score'], 1 / (k + 1))
+        self.assertAlmostEqual(results[3]['combined_score'], 1 / (k + 2))
+    
+    def test_rrf_respects_limit(self):
+        """Test that only the top fused results are returned."""
+        results = self.adapter.search_segments_hybrid('cars', limit=2, fusion='rrf')
+        
+        self.assertEqual(self.ids(results), ['C', 'A'])
+    
+    def test_weighted_fusion_uses_scores(self):
+        """Test that weighted fusion combines normalized scores instead."""
+        results = self.adapter.search_segments_hybrid('cars', limit=10, rag_weight=0.7)
+        
+        self.assertEqual(self.ids(results), ['A', 'C', 'B', 'D'])
+        self.assertAlmostEqual(results[0]['combined_score'], 0.7 * 0.99)
+        self.assertAlmostEqual(results[1]['combined_score'], 0.7 * 0.10 + 0.3 * 1.0)
+        self.assertAlmostEqual(results[1]['fts_score'], 1.0)
+
+
 class TestLiveRampProduction(unittest.TestCase):
     """Production-specific tests (only run in production environment)."""
     
@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+"""Tests for the signals agent's discovery pipeline."""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch, MagicMock
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the module-level services off the working directory's database
+os.environ.setdefault('DATABASE_PATH', os.path.join(tempfile.mkdtemp(), 'signals_agent.db'))
+
+import main
+from schemas import DeliverySpecification
+
+
+class TestDiscoveryDedup(unittest.TestCase):
+    """Test that duplicate get_signals calls share one discovery run."""
+    
+    def setUp(self):
+        """Start every test with no running discoveries."""
+        main._discoveries_in_flight.clear()
+        self.calls = 0
+        self.deliver_to = DeliverySpecification(platforms="all")
+    
+    def get_signals(self, signal_spec='luxury car buyers'):
+        """Call the get_signals tool function."""
+        return main.get_signals.fn(signal_spec, self.deliver_to)
+    
+    def fake_discover(self, result=None, error=None, delay=0.1):
+        """Build a discover_signals stand-in that counts its runs.
+        
+        Without a result, each run returns a new object.
+        """
+        def discover(*args):
+            self.calls += 1
+            time.sleep(delay)
+            if error is not None:
+                raise error
+            return result if result is not None else object()
+        return discover
+    
+    def test_concurrent_duplicates_share_one_run(self):
+        """Test that a duplicate arriving mid-run awaits the first run."""
+        response = object()
+        
+        async def run():
+            return await asyncio.gather(self.get_signals(), self.get_signals())
+        
+        with patch.object(main, 'discover_signals', self.fake_discover(response)):
+            first, second = asyncio.run(run())
+        
+        self.assertIs(first, response)
+        self.assertIs(second, response)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(main._discoveries_in_flight, {})
+    
+    def test_errors_reach_every_waiter_and_are_not_cached(self):
+        """Test that a failed run fails its waiters and the next call retries."""
+        async def run():
+            return await asyncio.gather(self.get_signals(), self.get_signals(),
+                                        return_exceptions=True)
+        
+        with patch.object(main, 'discover_signals', self.fake_discover(error=RuntimeError('boom'))):
+            results = asyncio.run(run())
+        
+        self.assertEqual(len(results), 2)
+        for result in results:
+            self.assertIsInstance(result, RuntimeError)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(main._discoveries_in_flight, {})
+        
+        response = object()
+        with patch.object(main, 'discover_signals', self.fake_discover(response, delay=0)):
+            self.assertIs(asyncio.run(self.get_signals()), response)
+        self.assertEqual(self.calls, 2)
+    
+    def test_completed_response_is_not_reused(self):
+        """Test that a repeat after the first call finished runs its own discovery."""
+        with patch.object(main, 'discover_signals', self.fake_discover(delay=0)):
+            first = asyncio.run(self.get_signals())
+            second = asyncio.run(self.get_signals())
+        
+        self.assertIsNot(second, first)
+        self.assertEqual(self.calls, 2)
+    
+    def test_different_requests_are_not_shared(self):
+        """Test that a different query running at the same time gets its own discovery."""
+        async def run():
+            return await asyncio.gather(self.get_signals('luxury car buyers'),
+                                        self.get_signals('pet owners'))
+        
+        with patch.object(main, 'discover_signals', self.fake_discover()):
+            first, second = asyncio.run(run())
+        
+        self.assertIsNot(second, first)
+        self.assertEqual(self.calls, 2)
+    
+    def test_case_variants_are_not_shared(self):
+        """Test that a differently cased query gets a response quoting its own text."""
+        async def run():
+            return await asyncio.gather(self.get_signals('luxury car buyers'),
+                                        self.get_signals('Luxury Car Buyers'))
+        
+        with patch.object(main, 'discover_signals', self.fake_discover()):
+            first, second = asyncio.run(run())
+        
+        self.assertIsNot(second, first)
+        self.assertEqual(self.calls, 2)
+
+
+class TestDiscoveryProposals(unittest.TestCase):
+    """Test when discovery asks Gemini for custom segment proposals."""
+    
+    def setUp(self):
+        """Stub the searches, ranking and context storage around discover_signals."""
+        self.segment = {
+            'id': 'liveramp_1', 'name': 'Luxury Car Buyers', 'description': 'In-market luxury shoppers',
+            'data_provider': 'LiveRamp (Acme)', 'coverage_percentage': 1.2, 'base_cpm': 2.5,
+            'revenue_share_percentage': 0.0, 'platform': 'liveramp', 'account_id': None
+        }
+        self.ranked = [dict(self.segment, match_reason='Matches luxury auto intent')]
+        self.platform_segments = [self.segment]
+        self.proposals = MagicMock(return_value=[])
+        self.rank = MagicMock(side_effect=lambda *args: self.ranked)
+        patches = [
+            patch.object(main, 'determine_search_strategy', return_value=('fts', False)),
+            patch.object(main.db_search_service, 'search', return_value=[]),
+            patch.object(main.adapter_manager, 'get_all_segments', side_effect=lambda *args: self.platform_segments),
+            patch.object(main, 'rank_signals_with_ai', self.rank),
+            patch.object(main, 'generate_custom_segment_proposals', self.proposals),
+            patch.object(main, 'store_discovery_context'),
+            patch.object(main, 'generate_discovery_message', return_value='message'),
+            patch.object(main.console, 'print'),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    def discover(self, platforms='all'):
+        """Run discovery for a fixed query."""
+        return main.discover_signals('luxury car buyers', DeliverySpecification(platforms=platforms))
+    
+    def test_proposals_use_the_ranked_segments(self):
+        """Test that proposals are built from the AI-ranked segments."""
+        response = self.discover()
+        
+        self.assertEqual(len(response.signals), 1)
+        self.proposals.assert_called_once_with('luxury car buyers', self.ranked)
+    
+    def test_no_segments_skips_ranking_and_proposals(self):
+        """Test that neither Gemini call is made when nothing was found."""
+        self.platform_segments = []
+        
+        response = self.discover()
+        
+        self.assertEqual(response.signals, [])
+        self.rank.assert_not_called()
+        self.proposals.assert_not_called()
+    
+    def test_no_matching_signals_skips_proposals(self):
+        """Test that proposals are not requested when no ranked segment is deliverable."""
+        response = self.discover(platforms=[{'platform': 'the-trade-desk'}])
+        
+        self.assertEqual(response.signals, [])
+        self.rank.assert_called_once()
+        self.proposals.assert_not_called()
+
+class TestMemoryCacheCleanup(unittest.TestCase):
+    """Test pruning the custom segment store while discovery threads add to it."""
+    
+    def setUp(self):
+        """Start every test from an empty store."""
+        main.custom_segments.clear()
+        self.addCleanup(main.custom_segments.clear)
+    
+    def add_segments(self, worker, count):
+        """Store custom segments the way discovery does, pruning after each."""
+        for i in range(count):
+            with main._memory_cache_lock:
+                main.custom_segments[f'custom_{worker}_{i}'] = {'created_at': f'{i:06d}'}
+            main.cleanup_memory_caches()
+    
+    def test_concurrent_cleanup_keeps_newest_segments(self):
+        """Test that threads storing and pruning at once never fail or lose the newest entries."""
+        store = main.custom_segments
+        with patch.object(main, 'MAX_CUSTOM_SEGMENTS', 40), \
+             patch.object(main.console, 'print'):
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                # Propagates any "dictionary changed size" error from a worker
+                list(pool.map(self.add_segments, range(4), [500] * 4))
+        
+        self.assertIs(main.custom_segments, store)
+        self.assertEqual(len(store), 40)
+        for worker in range(4):
+            self.assertIn(f'custom_{worker}_499', store)
+
+
+class TestAiResultCache(unittest.TestCase):
+    """Test the cache of parsed Gemini answers behind generate_ai_json."""
+    
+    def setUp(self):
+        """Start every test from an empty cache and a fake model."""
+        main._ai_result_cache.clear()
+        self.addCleanup(main._ai_result_cache.clear)
+        self.model = MagicMock()
+        self.model.generate_content.return_value = MagicMock(text='{"ranked": [1, 2]}')
+        patcher = patch.object(main, 'get_model', return_value=self.model)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_repeated_key_skips_the_model(self):
+        """Test that a second call with the same key reuses the parsed answer."""
+        first = main.generate_ai_json(('rank', 'cars'), 'prompt')
+        second = main.generate_ai_json(('rank', 'cars'), 'prompt')
+        
+        self.assertEqual(first, {'ranked': [1, 2]})
+        self.assertIs(second, first)
+        self.assertEqual(self.model.generate_content.call_count, 1)
+    
+    def test_fenced_answer_is_parsed(self):
+        """Test that a markdown-fenced JSON answer is unwrapped."""
+        self.model.generate_content.return_value = MagicMock(text='```json\n[{"id": "a"}]\n```')
+        self.assertEqual(main.generate_ai_json(('rank', 'cars'), 'prompt'), [{'id': 'a'}])
+    
+    def test_errors_are_not_cached(self):
+        """Test that a failed call leaves no entry and the next call retries."""
+        self.model.generate_content.return_value = MagicMock(text='not json')
+        with self.assertRaises(ValueError):
+            main.generate_ai_json(('rank', 'cars'), 'prompt')
+        self.assertEqual(main._ai_result_cache, {})
+        
+        self.model.generate_content.return_value = MagicMock(text='[]')
+        self.assertEqual(main.generate_ai_json(('rank', 'cars'), 'prompt'), [])
+        self.assertEqual(self.model.generate_content.call_count, 2)
+    
+    def test_full_cache_evicts_least_recently_used(self):
+        """Test that a full cache drops the entry that was used longest ago."""
+        with patch.object(main, 'AI_RESULT_CACHE_SIZE', 2):
+            main.generate_ai_json(('a',), 'prompt')
+            main.generate_ai_json(('b',), 'prompt')
+            # Touching 'a' makes 'b' the oldest
+            main.generate_ai_json(('a',), 'prompt')
+            main.generate_ai_json(('c',), 'prompt')
+        
+        self.assertEqual(list(main._ai_result_cache), [('a',), ('c',)])
+
+
+class TestGetModel(unittest.TestCase):
+    """Test the lazily built shared Gemini model."""
+    
+    def test_concurrent_first_calls_build_one_model(self):
+        """Test that threads racing on first use share a single model."""
+        genai = MagicMock()
+        
+        def build(name):
+            time.sleep(0.05)
+            return object()
+        genai.GenerativeModel.side_effect = build
+        google = MagicMock(generativeai=genai)
+        
+        with patch.dict(sys.modules, {'google': google, 'google.generativeai': genai}), \
+             patch.object(main, 'model', None):
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                models = list(pool.map(lambda _: main.get_model(), range(4)))
+        
+        self.assertEqual(genai.GenerativeModel.call_count, 1)
+        self.assertTrue(all(m is models[0] for m in models))
+
+
+if __name__ == '__main__':
+    unittest.main()